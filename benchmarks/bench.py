@@ -0,0 +1,212 @@
+'''Benchmarks of paco over generated inputs.
+
+    python benchmarks/bench.py [--scale N] [--repeat N] [--filter TEXT]
+                               [--save FILE] [--compare [FILE]]
+
+Inputs are generated from a fixed seed and grow linearly with `--scale`.
+Every case reports the best of `--repeat` runs. `--save` writes the
+results as JSON; `--compare` reads such a file, benchmarks/baseline.json
+when none is given, prints each case next to its baseline and exits with
+1 when a case is slower than the baseline by more than `--tolerance`.
+Timings depend on the machine: save a baseline of your own before
+comparing changes against it.'''
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.join(ROOT, 'examples'))
+sys.setrecursionlimit(100000)
+
+from paco.combinators import (Lazy, Many, ParseError)
+from paco.atomic import (Char, Literal, Regex)
+from paco.miscellaneous import (FLOAT, INTEGER, OWS, LETTERS)
+from paco.lexer import (lexx, lexx2, clexx, dlexx)
+
+CASES = {}
+
+def case(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+def check(parser, text):
+    res = parser(text)
+    if isinstance(res, ParseError) or res[0] != len(text):
+        raise AssertionError('Benchmark input does not parse: {}'.format(res))
+
+@case('recursive_array')
+def recursive_array(scale, rand):
+    from recursive_array import array
+    def element(depth):
+        kind = rand.random()
+        if depth < 3 and kind < 0.3:
+            return '[' + ', '.join(element(depth + 1) for _ in range(rand.randrange(1, 6))) + ']'
+        if kind < 0.55:
+            return str(rand.randrange(1, 10 ** 6))
+        if kind < 0.8:
+            return '{:.4f}'.format(rand.random() * 1000)
+        return "'{}'".format(''.join(rand.choice('abcdef ') for _ in range(rand.randrange(8))))
+    text = ' [' + ', '.join(element(0) for _ in range(10000 * scale)) + '] '
+    check(array, text)
+    return lambda: array(text)
+
+@case('json')
+def json_grammar(scale, rand):
+    value = Lazy()
+    token = lambda p : p << OWS
+    string = token(Regex(r'"(?:[^"\\]|\\.)*"')).map(json.loads)
+    number = token(Regex(r'-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+\-]?[0-9]+)?')).map(json.loads)
+    constant = (token(Literal('true')).map(lambda _ : True) | token(Literal('false')).map(lambda _ : False)
+                | token(Literal('null')).map(lambda _ : None))
+    member = (string << token(Char(':'))) + value
+    obj = (token(Char('{')) >> member.sepby(token(Char(','))) << token(Char('}'))).map(dict)
+    empty = token(Char('{')) + token(Char('}'))
+    arr = token(Char('[')) >> value.sepby(token(Char(','))) << token(Char(']'))
+    value.p = obj | empty.map(lambda _ : {}) | arr | string | number | constant
+    document = OWS >> value
+
+    def generate(depth):
+        kind = rand.random()
+        if depth < 4 and kind < 0.25:
+            return {'k{}'.format(i) : generate(depth + 1) for i in range(rand.randrange(1, 6))}
+        if depth < 4 and kind < 0.4:
+            return [generate(depth + 1) for _ in range(rand.randrange(1, 6))]
+        if kind < 0.6:
+            return rand.randrange(-10 ** 6, 10 ** 6)
+        if kind < 0.7:
+            return rand.random()
+        if kind < 0.9:
+            return 'v' * rand.randrange(12) + '\\"'
+        return rand.choice([True, False, None])
+    data = [generate(0) for _ in range(3000 * scale)]
+    text = json.dumps(data, indent=1)
+    if document(text)[1] != data:
+        raise AssertionError('JSON grammar disagrees with the json module')
+    return lambda: document(text)
+
+@case('deep_lazy')
+def deep_lazy(scale, rand):
+    nested = Lazy()
+    nested.p = (Char('(') >> nested << Char(')')) | Char('x')
+    group = Many(nested << OWS)
+    text = ' '.join('(' * d + 'x' + ')' * d for d in (rand.randrange(200) for _ in range(400 * scale)))
+    check(group, text)
+    return lambda: group(text)
+
+@case('wide_choice')
+def wide_choice(scale, rand):
+    words = sorted({''.join(rand.choice('abcdefghij') for _ in range(rand.randrange(3, 9)))
+                    for _ in range(300)})
+    alternatives = [Literal(w) for w in sorted(words, key=len, reverse=True)]
+    keyword = alternatives[0]
+    for alt in alternatives[1:]:
+        keyword = keyword | alt
+    keyword = keyword | INTEGER | Char(';')
+    program = Many(keyword << OWS)
+    text = ' '.join(rand.choice(words + ['42', ';']) for _ in range(50000 * scale))
+    check(program, text)
+    return lambda: program(text)
+
+@case('many_sepby')
+def many_sepby(scale, rand):
+    numbers = FLOAT.sepby(Char(',') << OWS)
+    letters = Many(LETTERS | Char(' '))
+    csv = ', '.join('{:.3f}'.format(rand.random()) for _ in range(50000 * scale))
+    words = ' '.join(''.join(rand.choice('xyz') for _ in range(rand.randrange(1, 8)))
+                     for _ in range(50000 * scale))
+    check(numbers, csv)
+    check(letters, words)
+    return lambda: (numbers(csv), letters(words))
+
+RULES = [('num', r'[0-9]+(?:\.[0-9]+)?'), ('id', r'[a-zA-Z_][a-zA-Z0-9_]*'),
+         ('str', r"'[^']*'"), ('op', r'[+\-*/=<>!]=?'), ('punct', r'[()\[\]{},;:]'),
+         (None, r'[ \t\n]+')]
+
+def source(scale, rand):
+    pieces = ['x', 'count_1', '42', '3.14', "'text'", '+', '==', '(', ')', ';', '\n', ' ', '  ']
+    return ' '.join(rand.choice(pieces) for _ in range(100000 * scale))
+
+@case('lexx')
+def lexx_case(scale, rand):
+    text, tokenizer = source(scale, rand), lexx(RULES)
+    return lambda: tokenizer(text)
+
+@case('lexx2')
+def lexx2_case(scale, rand):
+    text, tokenizer = source(scale, rand), lexx2(RULES)
+    return lambda: tokenizer(text)
+
+@case('clexx')
+def clexx_case(scale, rand):
+    text, tokenizer = source(scale, rand), clexx(RULES)
+    return lambda: tokenizer(text)
+
+@case('dlexx')
+def dlexx_case(scale, rand):
+    text, tokenizer = source(scale, rand), dlexx(RULES)
+    return lambda: tokenizer(text)
+
+def measure(run, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main(argv = None):
+    args = argparse.ArgumentParser(description = 'Benchmarks of paco.')
+    args.add_argument('--scale', type = int, default = 1, help = 'input size multiplier')
+    args.add_argument('--repeat', type = int, default = 5, help = 'runs per case, the best is kept')
+    args.add_argument('--filter', default = '', help = 'only run the cases whose name contains this')
+    args.add_argument('--save', metavar = 'FILE', help = 'write the results as JSON')
+    args.add_argument('--compare', metavar = 'FILE', nargs = '?', const = BASELINE,
+                      help = 'compare against saved results (default benchmarks/baseline.json)')
+    args.add_argument('--tolerance', type = float, default = 0.1,
+                      help = 'allowed slowdown against the baseline (default 0.1)')
+    args = args.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline['scale'] != args.scale:
+            print('warning: baseline was measured with --scale {}'.format(baseline['scale']))
+        baseline = baseline['results']
+
+    results, slower = {}, []
+    for name, setup in CASES.items():
+        if args.filter not in name:
+            continue
+        results[name] = measure(setup(args.scale, random.Random(name)), args.repeat)
+        line = '{:<16} {:9.4f}s'.format(name, results[name])
+        if baseline and name in baseline:
+            ratio = results[name] / baseline[name]
+            line += '   baseline {:9.4f}s   x{:.2f}'.format(baseline[name], ratio)
+            if ratio > 1 + args.tolerance:
+                slower.append(name)
+                line += '   SLOWER'
+        print(line, flush = True)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python' : platform.python_version(), 'platform' : platform.platform(),
+                       'scale' : args.scale, 'repeat' : args.repeat, 'results' : results},
+                      f, indent = 2)
+            f.write('\n')
+    if slower:
+        print('slower than the baseline: {}'.format(', '.join(slower)))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
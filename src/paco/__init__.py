@@ -1 +1,21 @@
-from . import combinators, atomic, miscellaneous, lexer
+import importlib
+import sys
+
+# Submodules are imported on first access, so `import paco` stays cheap
+# for programs that only use part of it.
+_SUBMODULES = ('combinators', 'atomic', 'miscellaneous', 'lexer')
+__all__ = list(_SUBMODULES)
+
+if sys.version_info < (3, 7):
+    # Module __getattr__ (PEP 562) is only looked up from Python 3.7.
+    for _name in _SUBMODULES:
+        importlib.import_module('.' + _name, __name__)
+    del _name
+
+def __getattr__(name : str):
+    if name in _SUBMODULES:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+def __dir__():
+    return sorted(set(globals()) | set(_SUBMODULES))
@@ -1,6 +1,79 @@
 
+import mmap
 import re
-from .combinators import Parser, ParseError
+from .combinators import Parser, ParseError, _lazy_property
+from .state import state
+from .lexer import TokenArray
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:
+    import sre_parse, sre_constants
+
+_REPEATS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT,
+            getattr(sre_constants, 'POSSESSIVE_REPEAT', None)}
+_ZERO_WIDTH = {sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT}
+
+BUFFERS = (bytes, bytearray, memoryview, mmap.mmap)
+'''Binary targets the atomic parsers can run over without decoding.'''
+
+def _show(chunk) -> str:
+    if isinstance(chunk, BUFFERS):
+        return bytes(chunk).decode('utf-8', 'replace')
+    return chunk
+
+_DEFAULT_FLAGS = re.compile('').flags
+_GROUPREFS = (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS)
+
+def _has_groupref(node):
+    if isinstance(node, (tuple, list, sre_parse.SubPattern)):
+        if len(node) == 2 and any(node[0] is op for op in _GROUPREFS):
+            return True
+        return any(_has_groupref(n) for n in node)
+    return False
+
+def _regex_first(items):
+    '''(chars, nullable) for parsed regex items, chars None if unknown.'''
+    chars = set()
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            first, nullable = {chr(av)}, False
+        elif op is sre_constants.IN:
+            first, nullable = set(), False
+            for kind, arg in av:
+                if kind is sre_constants.LITERAL:
+                    first.add(chr(arg))
+                elif kind is sre_constants.RANGE and arg[1] - arg[0] < 256:
+                    first.update(map(chr, range(arg[0], arg[1] + 1)))
+                else:
+                    return (None, True)
+        elif op is sre_constants.SUBPATTERN:
+            if av[1] & re.IGNORECASE:
+                return (None, True)
+            first, nullable = _regex_first(av[-1])
+        elif op is getattr(sre_constants, 'ATOMIC_GROUP', None):
+            first, nullable = _regex_first(av)
+        elif op is sre_constants.BRANCH:
+            first, nullable = set(), False
+            for branch in av[1]:
+                (f, n) = _regex_first(branch)
+                if f is None:
+                    return (None, True)
+                first |= f
+                nullable = nullable or n
+        elif op in _REPEATS:
+            first, nullable = _regex_first(av[2])
+            nullable = nullable or av[0] == 0
+        elif op in _ZERO_WIDTH:
+            continue
+        else:
+            return (None, True)
+        if first is None:
+            return (None, True)
+        chars |= first
+        if not nullable:
+            return (chars, False)
+    return (chars, True)
 
 class Char(Parser):
     def __init__(self, char : str) -> None:
@@ -8,13 +81,36 @@ class Char(Parser):
         self.name = 'char(\'{}\')'.format(char)
         self.char = char
     
-    def run(self, pos : int, tar : str):
+    def _parse(self, pos : int, tar : str):
         if (len(tar) > pos) and (tar[pos] == self.char):
             return (pos + 1, self.char)
-        
-        got = tar[pos] if len(tar) > pos else "EOF"
+        if tar.__class__ is not str and isinstance(tar, BUFFERS):
+            return self._parse_buffer(pos, tar)
+        state.failure = (self, pos)
+        if pos >= state.furthest:
+            state.expect(self, pos)
+        return None
+
+    def _parse_buffer(self, pos : int, tar : bytes):
+        if len(self.char) == 1:
+            code = self.char.encode()
+            if tar[pos:pos + len(code)] == code:
+                return (pos + len(code), code)
+        state.failure = (self, pos)
+        if pos >= state.furthest:
+            state.expect(self, pos)
+        return None
+
+    def _pattern(self):
+        return (re.escape(self.char), self.char) if len(self.char) == 1 else None
+
+    def _first(self, seen : set):
+        return (frozenset(self.char if len(self.char) == 1 else ()), False)
+
+    def _error(self, pos : int, tar : str):
+        got = _show(tar[pos:pos+1]) if len(tar) > pos else "EOF"
         msg = f"Excpected '{self.char}' but got '{got}'"
-        raise ParseError(pos, pos + 1, msg, self)
+        return ParseError(pos, pos + 1, msg, self)
 
 class Literal(Parser):
 
@@ -24,44 +120,224 @@ class Literal(Parser):
         self.literal = literal
         self.length = len(literal)
     
-    def run(self, pos : int, tar : str):
-        if tar.startswith(self.literal,pos):
-            return (pos + self.length, self.literal)
+    def _parse(self, pos : int, tar : str):
+        try:
+            if tar.startswith(self.literal,pos):
+                return (pos + self.length, self.literal)
+        except (TypeError, AttributeError):
+            if not isinstance(tar, BUFFERS):
+                raise
+            return self._parse_buffer(pos, tar)
+        state.failure = (self, pos)
+        if pos >= state.furthest:
+            state.expect(self, pos)
+        return None
+
+    def _parse_buffer(self, pos : int, tar : bytes):
+        code = self.literal.encode()
+        if tar[pos:pos + len(code)] == code:
+            return (pos + len(code), code)
+        state.failure = (self, pos)
+        if pos >= state.furthest:
+            state.expect(self, pos)
+        return None
+
+    def _pattern(self):
+        return (re.escape(self.literal), self.literal)
+
+    def _first(self, seen : set):
+        return (frozenset(self.literal[:1]), not self.literal)
+
+    def _error(self, pos : int, tar : str):
         if len(tar) > (pos + self.length-1):
-            msg = f"Tried to match '{self.literal}' but got '{tar[pos:pos+self.length]}'"
-            raise ParseError(pos, pos + self.length, msg, self)
+            msg = f"Tried to match '{self.literal}' but got '{_show(tar[pos:pos+self.length])}'"
+            return ParseError(pos, pos + self.length, msg, self)
         msg = f"Tried to match '{self.literal}' but got EOF"
-        raise ParseError(pos, pos + self.length, msg, self)
+        return ParseError(pos, pos + self.length, msg, self)
         
+class Literals(Parser):
+    '''Matches one of many literals with a trie walk over the target.
+
+    Behaves like `Literal(a) | Literal(b) | ...`: the first literal in the
+    given order that matches wins. With `longest=True` the longest matching
+    literal wins instead. The cost depends on the length of the match and
+    not on the number of literals.'''
+
+    _caches = (('_buffer_trie', None),)
+
+    def __init__(self, *literals : str, longest : bool = False) -> None:
+        super().__init__()
+        self.name = 'lits({})'.format(', '.join('\'{}\''.format(l) for l in literals))
+        self.literals = literals
+        self.longest = longest
+        self.length = max(map(len, literals), default=0)
+        # A trie node is [children, index of the literal ending here, lowest
+        # index in the subtree]; the last entry allows the walk to stop as
+        # soon as nothing deeper can beat the current match.
+        self.trie = self._build(literals)
+        self._buffer_trie = None
+
+    @staticmethod
+    def _build(literals):
+        trie = [{}, None, len(literals)]
+        for i, lit in reversed(list(enumerate(literals))):
+            node = trie
+            node[2] = i
+            for c in lit:
+                node = node[0].setdefault(c, [{}, None, i])
+                node[2] = i
+            node[1] = i
+        return trie
+
+    def _parse(self, pos : int, tar : str):
+        res = self._walk(pos, tar, self.trie, self.literals)
+        if res is None and tar.__class__ is not str and isinstance(tar, BUFFERS):
+            # Indexing a binary target yields ints, which the encoded trie
+            # is keyed by.
+            if self._buffer_trie is None:
+                codes = [lit.encode() for lit in self.literals]
+                self._buffer_trie = (self._build(codes), codes)
+            res = self._walk(pos, tar, *self._buffer_trie)
+        if res is None:
+            state.failure = (self, pos)
+            if pos >= state.furthest:
+                state.expect(self, pos)
+        return res
+
+    def _walk(self, pos : int, tar, trie : list, literals):
+        node, best, end = trie, trie[1], pos
+        i = pos
+        while True:
+            try:
+                node = node[0].get(tar[i])
+            except IndexError:
+                break
+            if node is None or (best is not None and not self.longest and node[2] > best):
+                break
+            i += 1
+            if node[1] is not None and (self.longest or best is None or node[1] < best):
+                best, end = node[1], i
+        if best is None:
+            return None
+        return (end, literals[best])
+
+    def _first(self, seen : set):
+        return (frozenset(self.trie[0]), self.trie[1] is not None)
+
+    def _error(self, pos : int, tar : str):
+        msg = f"Tried to match one of {list(self.literals)} but got "
+        if len(tar) > (pos + self.length-1):
+            msg += f"'{_show(tar[pos:pos+self.length])}'"
+        else:
+            msg += "EOF"
+        return ParseError(pos, pos + self.length, msg, self)
+
 class Regex(Parser):
+    _caches = (('_buffer_rule', None),)
 
     def __init__(self, rule : str) -> None:
         super().__init__()
         self.name = 'reg(r\'{}\')'.format(rule)
-        self.rule = re.compile(rule)
-    
-    def run(self, pos : int, tar : str):
-        m = self.rule.match(tar, pos)
+        self.source = rule
+        self._buffer_rule = None
+
+    @_lazy_property
+    def rule(self):
+        # Compiled on first use, so defining a grammar compiles nothing.
+        return re.compile(self.source)
+
+    def _compile(self) -> None:
+        self.rule
+
+    def _parse(self, pos : int, tar : str):
+        try:
+            m = self.rule.match(tar, pos)
+        except TypeError:
+            if not isinstance(tar, BUFFERS):
+                raise
+            if self._buffer_rule is None:
+                self._buffer_rule = re.compile(self.rule.pattern.encode(), self.rule.flags & ~re.UNICODE)
+            m = self._buffer_rule.match(tar, pos)
         if m is None:
-            msg = f"Couldn't match the rule: {self.rule}"
-            raise ParseError(pos, pos, msg, self)
+            state.failure = (self, pos)
+            if pos >= state.furthest:
+                state.expect(self, pos)
+            return None
         return (m.end(), m.group())
 
+    def _recognize(self, pos : int, tar : str):
+        try:
+            m = self.rule.match(tar, pos)
+        except TypeError:
+            return Parser._recognize(self, pos, tar)
+        if m is None:
+            state.failure = (self, pos)
+            if pos >= state.furthest:
+                state.expect(self, pos)
+            return None
+        return m.end()
+
+    def _pattern(self):
+        if self.rule.flags != _DEFAULT_FLAGS or self.rule.groupindex:
+            return None
+        if _has_groupref(sre_parse.parse(self.rule.pattern, self.rule.flags)):
+            return None
+        return (self.rule.pattern, None)
+
+    def _first(self, seen : set):
+        if self.rule.flags & re.IGNORECASE:
+            return (None, True)
+        (chars, nullable) = _regex_first(sre_parse.parse(self.rule.pattern, self.rule.flags))
+        return (None if chars is None else frozenset(chars), nullable)
+
+    def _error(self, pos : int, tar : str):
+        msg = f"Couldn't match the rule: {self.rule}"
+        return ParseError(pos, pos, msg, self)
+
 class Tok(Parser):
+    _caches = (('_code', (None, -1)),)
 
     def __init__(self, tag : str, data = None):
+        super().__init__()
+        self.name = 'tok({})'.format(', '.join(repr(a) for a in (tag, data) if a))
         self.tag, self.data = tag, data
-        if data:
-            self.condition = lambda t : (t.type == tag) and (t.data == data)
-        else:
-            self.condition = lambda t : (t.type == tag)
+        self._code = (None, -1)
+
+    def condition(self, t) -> bool:
+        return (t.type == self.tag) and (not self.data or t.data == self.data)
     
-    def run(self, pos : int, tar : list):
-        if len(tar) > pos:
+    def _parse(self, pos : int, tar : list):
+        if tar.__class__ is TokenArray:
+            if self._code[0] is not tar.codes:
+                self._code = (tar.codes, tar.codes.get(self.tag, -1))
+            kinds = tar.kinds
+            if pos < len(kinds) and kinds[pos] == self._code[1]:
+                if not self.data or tar.data_is(pos, self.data):
+                    return (pos + 1, tar.text[tar.starts[pos]:tar.ends[pos]])
+            state.failure = (self, pos)
+            if pos >= state.furthest:
+                state.expect(self, pos)
+            return None
+        # Indexed rather than measured: a LazyTokens target only lexes as
+        # far as it is read.
+        try:
             tok = tar[pos]
-            if self.condition(tok):
-                return (pos + 1, tok.data)
-            msg = 'Expected Token {} but got {}'.format((self.tag,self.data),tok)
-            raise ParseError(tok.start, tok.end, msg, self)
-        else:
-            raise ParseError(pos, pos, 'Got EOF', self)
+        except IndexError:
+            tok = None
+        if tok is not None and self.condition(tok):
+            return (pos + 1, tok.data)
+        state.failure = (self, pos)
+        if pos >= state.furthest:
+            state.expect(self, pos)
+        return None
+
+    def _first(self, seen : set):
+        return (frozenset((self.tag,)), False)
+
+    def _error(self, pos : int, tar : list):
+        try:
+            tok = tar[pos]
+        except IndexError:
+            return ParseError(pos, pos, 'Got EOF', self)
+        msg = 'Expected Token {} but got {}'.format((self.tag,self.data),tok)
+        return ParseError(tok.start, tok.end, msg, self)
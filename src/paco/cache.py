@@ -0,0 +1,109 @@
+import hashlib
+import os
+import pickle
+import sys
+from . import combinators
+from .combinators import (Parser, Sequence, KeepLeft, KeepRight, Choice, walk, _fuse)
+
+_MODES = {Sequence : 'all', KeepLeft : 'first', KeepRight : 'last'}
+
+_PACKAGE = os.path.dirname(os.path.abspath(__file__))
+
+def _source(build) -> str:
+    module = sys.modules.get(build.__module__)
+    path = getattr(module, '__file__', None)
+    if path is None:
+        raise ValueError('{!r} is not defined in a source file'.format(build))
+    return os.path.abspath(path)
+
+def fingerprint(build, depends=()) -> str:
+    '''A digest of everything a grammar built by `build` is derived from:
+    the source file defining it, the files in `depends` (paths or modules),
+    paco itself and the Python version.'''
+    paths = [_source(build)]
+    paths += [os.path.abspath(getattr(d, '__file__', d)) for d in depends]
+    paths += sorted(os.path.join(_PACKAGE, f) for f in os.listdir(_PACKAGE) if f.endswith('.py'))
+    digest = hashlib.sha1(sys.version.encode())
+    digest.update(build.__qualname__.encode())
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(path.encode())
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def analyze(parser : Parser) -> list:
+    '''Builds the plans (fused steps, dispatch tables) of every node ahead
+    of the first parse and returns them as (node, plan) pairs.'''
+    plans = []
+    for p in walk(parser):
+        kind = type(p)
+        if kind in _MODES:
+            p._plan = (combinators._generation, _fuse(p.parsers, _MODES[kind]))
+        elif kind is Choice:
+            p._dispatch()
+        else:
+            continue
+        plans.append((p, p._plan))
+    return plans
+
+def save(parser : Parser, path : str, key : str = '') -> None:
+    '''Writes `parser` and its plans to `path`, tagged with `key`.'''
+    plans = analyze(parser)
+    temp = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(temp, 'wb') as f:
+            pickle.dump(key, f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump((parser, plans), f, pickle.HIGHEST_PROTOCOL)
+    except BaseException:
+        os.remove(temp)
+        raise
+    # Readers never see a partly written file.
+    os.replace(temp, path)
+
+def load(path : str, key : str = ''):
+    '''The parser saved at `path` with its plans in place, or None when
+    there is no such file or it was saved with another key.'''
+    try:
+        with open(path, 'rb') as f:
+            if pickle.load(f) != key:
+                return None
+            (parser, plans) = pickle.load(f)
+    except Exception:
+        # Missing, truncated or otherwise unreadable: built again.
+        return None
+    for (p, plan) in plans:
+        p._plan = (combinators._generation,) + plan[1:]
+    return parser
+
+def cached(build, path : str = None, depends=(), optimize : bool = False) -> Parser:
+    '''The grammar returned by `build()`, loaded from a cache file when the
+    grammar definition has not changed since it was saved.
+
+    The cache is keyed on the `fingerprint` of `build`: editing the file
+    that defines it, one of `depends` or upgrading paco builds and saves
+    the grammar again. It is kept next to the defining module by default,
+    in `__pycache__/<module>.<build>.paco`. With `optimize`, the grammar is
+    optimized before it is saved.
+
+    The functions of the grammar are pickled by reference, so they must be
+    importable (no lambdas); a grammar that can't be pickled is returned
+    without being cached.'''
+    key = fingerprint(build, depends)
+    if path is None:
+        source = _source(build)
+        stem = os.path.splitext(os.path.basename(source))[0]
+        path = os.path.join(os.path.dirname(source), '__pycache__',
+                            '{}.{}.paco'.format(stem, build.__qualname__))
+    parser = load(path, key)
+    if parser is not None:
+        return parser
+    parser = build()
+    if optimize:
+        parser = parser.optimize()
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        save(parser, path, key)
+    except (OSError, pickle.PicklingError, AttributeError, TypeError):
+        # A read-only location or a grammar holding lambdas.
+        pass
+    return parser
@@ -1,13 +1,98 @@
-from typing import Iterable
+import bisect
+import mmap
+import re
+import sys
+from collections.abc import Iterable
+from .packrat import Memo
+from .state import state
+
+class _lazy_property(object):
+    '''Like functools.cached_property (Python 3.8+): computed on first use
+    and stored on the instance, where later lookups find it first. Values
+    are not pickled.'''
+
+    def __init__(self, method) -> None:
+        self.method = method
+        self.name = method.__name__
+        self.__doc__ = method.__doc__
+
+    def __get__(self, obj, owner):
+        if obj is None:
+            return self
+        value = obj.__dict__[self.name] = self.method(obj)
+        return value
 
 class Parser(object):
+    # Built-in parsers implement `_parse`, which returns None on failure
+    # and leaves the failure in `state.failure` instead of raising. `run`
+    # keeps the raising protocol; subclasses may implement either one and
+    # the other is derived from it.
 
+    # (attribute, empty value) of the caches an instance keeps, which are
+    # rebuilt on first use rather than pickled.
+    _caches = ()
 
     def __init__(self) -> None:
         self.name = 'parser()'
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Wrappers installed on the instance (memo tables, profilers...)
+        # belong to a running parse, not to the grammar.
+        state.pop('_parse', None)
+        state.pop('_ready', None)
+        state.pop('_spans', None)
+        for name, empty in self._caches:
+            if name in state:
+                state[name] = empty
+        # Lazy properties (compiled regexes) are computed again on use.
+        for name in list(state):
+            if isinstance(getattr(type(self), name, None), _lazy_property):
+                del state[name]
+        return state
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if 'run' in cls.__dict__ and '_parse' not in cls.__dict__:
+            # An overridden run may match differently, so drop the analyses
+            # inherited from a built-in parser as well.
+            cls._parse = Parser._parse
+            cls._first = Parser._first
+            cls._pattern = Parser._pattern
+        elif '_parse' in cls.__dict__ and 'run' not in cls.__dict__:
+            cls.run = _raising(cls._parse)
+        if '_recognize' not in cls.__dict__ and ('_parse' in cls.__dict__ or 'run' in cls.__dict__):
+            cls._recognize = Parser._recognize
+
     def run(self, pos : int, tar ):
         raise NotImplementedError
+
+    def _parse(self, pos : int, tar ):
+        try:
+            return self.run(pos, tar)
+        except ParseError as e:
+            state.failure = (e, None)
+            return None
+
+    def _recognize(self, pos : int, tar ):
+        # Like `_parse`, but returns only the end of the match (None on
+        # failure); composites do not build their values.
+        res = self._parse(pos, tar)
+        return None if res is None else res[0]
+
+    def _error(self, pos : int, tar ):
+        raise NotImplementedError
+
+    def _pattern(self):
+        # (regex source, constant value or None when the value is the match)
+        # for atoms that may be fused into a larger regex, None otherwise.
+        return None
+
+    def _first(self, seen : set):
+        # (keys, nullable): the characters, or token types for token
+        # targets, a match can start with (None when unknown) and whether it
+        # can succeed consuming nothing.
+        return (None, True)
     
     def __add__(self, other):
         return Sequence(self, other)
@@ -21,13 +106,43 @@ class Parser(object):
     def __lshift__(self, other):
         return KeepLeft(self, other)
 
-    def __call__(self, stream : list, idx = 0):
-        if not isinstance(stream, Iterable):
+    def __call__(self, stream : list, idx = 0, packrat = False, spans = False):
+        if not isinstance(stream, (Iterable, mmap.mmap)):
             raise TypeError('Stream object should be iterable.')
+        _prepare(self)
+        parser = self
+        if spans:
+            # A copy of the grammar, so parses without spans running in
+            # other threads are unaffected.
+            from .spans import span_grammar
+            parser = span_grammar(self)
+        memo = packrat if isinstance(packrat, Memo) else (Memo() if packrat else None)
+        if memo is not None:
+            memo.install(walk(parser), stream)
+        state.reset()
         try:
-            return self.run(idx, stream)
-        except ParseError as e:
-            return e
+            res = parser._parse(idx, stream)
+        finally:
+            if memo is not None:
+                memo.uninstall()
+        _raise_stream_error(stream)
+        if res is None:
+            return parse_error(stream)
+        return res
+
+    def recognize(self, stream, idx = 0):
+        '''The end of the match at `idx`, or a ParseError, without
+        building any value. Map functions are not run, so values they would
+        reject are accepted.'''
+        if not isinstance(stream, (Iterable, mmap.mmap)):
+            raise TypeError('Stream object should be iterable.')
+        _prepare(self)
+        state.reset()
+        end = self._recognize(idx, stream)
+        _raise_stream_error(stream)
+        if end is None:
+            return parse_error(stream)
+        return end
     
     def __str__(self) -> str:
         return self.name
@@ -40,6 +155,12 @@ class Parser(object):
 
     def sepby(self, sep):
         return SepBy(self, sep)
+
+    def fold(self, init, func):
+        return Fold(self, init, func)
+
+    def sepfold(self, sep, init, func):
+        return Fold(self, init, func, sep)
     
     def between(self, left, right):
         return left >> self << right
@@ -50,11 +171,294 @@ class Parser(object):
     def then(self, other):
         return self << other
     
+    def iterparse(self, source, chunk_size : int = 1 << 16, lookahead : int = 1):
+        from .streaming import iterparse
+        return iterparse(self, source, chunk_size, lookahead)
+
+    def optimize(self):
+        from .optimizer import optimize
+        return optimize(self)
+
+    def compile(self):
+        from .compiler import compile_parser
+        return compile_parser(self)
+
+    def machine(self):
+        from .vm import Machine
+        return Machine(self)
+
+    def push(self, lookahead : int = 1):
+        from .push import PushParser
+        return PushParser(self, lookahead)
+
+    def parallel(self, text, boundary, workers : int = None, chunk_size : int = None):
+        from .parallel import parse_parallel
+        return parse_parallel(self, text, boundary, workers, chunk_size)
+
+    def parse_many(self, docs, workers : int = None, batch_size : int = 256):
+        from .parallel import parse_many
+        return parse_many(self, docs, workers, batch_size)
+
+    def incremental(self, text : str, margin : int = 1):
+        from .incremental import Document
+        return Document(self, text, margin)
+
     def rename(self, name : str):
         self.name = name
         return self
 
+    def _children(self):
+        return ()
+
+    def _compile(self) -> None:
+        # Builds what the parser compiles lazily (regexes), see _prepare.
+        pass
+
+TRIE_THRESHOLD = 4
+'''Consecutive Literal alternatives of a Choice merged into one trie.'''
+
+_generation = 0
+
+def _changed():
+    '''Invalidates plans derived from the grammar's structure.'''
+    global _generation
+    _generation += 1
+
+def _prepare(parser : Parser) -> None:
+    '''Compiles the regexes of the grammar of `parser` once per grammar
+    generation, before a parse: an invalid pattern would otherwise raise
+    inside a backtracking parser, which swallows the error.'''
+    if parser.__dict__.get('_ready') != _generation:
+        for p in walk(parser):
+            p._compile()
+        parser._ready = _generation
+
+def _first_of_sequence(parsers, seen : set):
+    chars = set()
+    for p in parsers:
+        (first, nullable) = p._first(seen)
+        if first is None:
+            return (None, True)
+        chars |= first
+        if not nullable:
+            return (frozenset(chars), False)
+    return (frozenset(chars), True)
+
+def _raising(parse):
+    def run(self, pos : int, tar ):
+        res = parse(self, pos, tar)
+        if res is None:
+            raise failure_error(tar)
+        return res
+    return run
+
+def _raise_stream_error(stream) -> None:
+    # Token streams lexed on demand (LazyTokens) keep the errors a parser
+    # that backtracks may have swallowed.
+    error = getattr(stream, 'error', None)
+    if isinstance(error, Exception):
+        raise error
+
+def failure_error(tar):
+    '''Builds the ParseError of the last failure recorded on `tar`.'''
+    culprit, pos = state.failure
+    return culprit if pos is None else culprit._error(pos, tar)
+
+def parse_error(tar):
+    '''The error of a whole parse that failed: the last failure, along
+    with the furthest one.'''
+    err = failure_error(tar)
+    if state.expected:
+        err.furthest = state.furthest
+        err.expected = _labels(state.expected)
+    return err
+
+def _labels(parsers) -> list:
+    # Renamed parsers and atoms are described by their name, others by what
+    # they start with: any of the alternatives of a Choice, the first child
+    # of other composites.
+    labels, seen = {}, set()
+    todo = list(reversed(list(parsers)))
+    while todo:
+        p = todo.pop()
+        if id(p) in seen:
+            continue
+        seen.add(id(p))
+        children = p._children()
+        name = getattr(p, 'name', 'parser()')
+        if name != 'parser()' or not children:
+            labels[name if name != 'parser()' else type(p).__name__] = None
+        elif isinstance(p, Choice):
+            todo.extend(reversed(children))
+        else:
+            todo.append(children[0])
+    return list(labels)
+
+class LineIndex(object):
+    '''Offsets of the lines of a text, to turn positions into 1-based
+    (line, column) pairs with a binary search.'''
+
+    def __init__(self, text) -> None:
+        newline = '\n' if isinstance(text, str) else b'\n'
+        self.starts = [0] + [m.end() for m in re.finditer(re.escape(newline), text)]
+
+    def locate(self, pos : int):
+        line = bisect.bisect_right(self.starts, pos)
+        return (line, pos - self.starts[line - 1] + 1)
+
+class _Fused(Parser):
+    # Adjacent atoms of a Sequence, KeepLeft or KeepRight matched by a single
+    # regex. Each Regex part is wrapped in an atomic group so it matches just
+    # as it would on its own. `keep` selects the values returned: 'all' as a
+    # list, 'first', 'last' or None. With `spans` the values of groups are
+    # Spans instead of strings.
+
+    def __init__(self, atoms : list, keep, spans : bool = False) -> None:
+        super().__init__()
+        self.name = 'fused({})'.format(', '.join(map(str, atoms)))
+        self.atoms = atoms
+        self.keep = keep
+        self.span = None
+        if spans:
+            from .spans import Span
+            self.span = Span
+        parts, values = [], []
+        for i, atom in enumerate(atoms):
+            (source, const) = atom._pattern()
+            want = (keep == 'all' or (keep == 'first' and i == 0)
+                    or (keep == 'last' and i == len(atoms) - 1))
+            group = 'g{}'.format(i)
+            if const is not None:
+                parts.append(source)
+            elif sys.version_info >= (3, 11):
+                parts.append('(?P<{}>(?>{}))'.format(group, source) if want else '(?>{})'.format(source))
+            else:
+                parts.append('(?=(?P<{0}>{1}))(?P={0})'.format(group, source))
+            if want:
+                values.append((group if const is None else None, const))
+        self.source = ''.join(parts)
+        self.groups = values
+
+    @_lazy_property
+    def match(self):
+        try:
+            return re.compile(self.source).match
+        except re.error:
+            # Some patterns can't be combined; the atoms are then matched
+            # one by one.
+            return _no_match
+
+    @_lazy_property
+    def values(self):
+        # (group number or None, constant) of each value kept.
+        index = self.match.__self__.groupindex
+        return [(g if g is None else index[g], c) for g, c in self.groups]
+
+    def _children(self):
+        return self.atoms
+
+    def _first(self, seen : set):
+        return _first_of_sequence(self.atoms, seen)
+
+    def _parse(self, pos : int, tar ):
+        try:
+            m = self.match(tar, pos)
+        except TypeError:
+            m = None
+        if m is None:
+            return self._sequential(pos, tar)
+        if self.span is not None:
+            return self._spans(m, tar)
+        if self.keep == 'all':
+            return (m.end(), [c if g is None else m.group(g) for g, c in self.values])
+        if self.keep is None:
+            return (m.end(), None)
+        (g, c) = self.values[0]
+        return (m.end(), c if g is None else m.group(g))
+
+    def _spans(self, m, tar):
+        span = self.span
+        values = [c if g is None else span(tar, m.start(g), m.end(g)) for g, c in self.values]
+        if self.keep == 'all':
+            return (m.end(), values)
+        return (m.end(), values[0] if values else None)
+
+    def _recognize(self, pos : int, tar ):
+        try:
+            m = self.match(tar, pos)
+        except TypeError:
+            m = None
+        if m is None:
+            res = self._sequential(pos, tar)
+            return None if res is None else res[0]
+        return m.end()
+
+    def _sequential(self, pos : int, tar ):
+        data = list()
+        for atom in self.atoms:
+            res = atom._parse(pos, tar)
+            if res is None:
+                return None
+            (pos, res) = res
+            data.append(res)
+        if self.keep == 'all':
+            return (pos, data)
+        if self.keep is None:
+            return (pos, None)
+        return (pos, data[0] if self.keep == 'first' else data[-1])
+
+def _no_match(tar, pos : int):
+    return None
+
+def _fuse(parsers : list, keep, spans : bool = False):
+    '''Replaces runs of adjacent fusable atoms with `_Fused` steps.
+
+    Returns None when there is nothing to fuse. `keep` is 'all' for a
+    Sequence, 'first' for a KeepLeft and 'last' for a KeepRight.'''
+    steps, run, fused = [], [], False
+    for i, p in enumerate(parsers + [None]):
+        if p is not None and p._pattern() is not None:
+            run.append((i, p))
+            continue
+        if len(run) > 1:
+            first, last = run[0][0], run[-1][0]
+            mode = ('all' if keep == 'all' else
+                    'first' if keep == 'first' and first == 0 else
+                    'last' if keep == 'last' and last == len(parsers) - 1 else None)
+            steps.append(_Fused([a for _, a in run], mode, spans))
+            fused = True
+        else:
+            steps.extend(a for _, a in run)
+        run = []
+        if p is not None:
+            steps.append(p)
+    return steps if fused else None
+
+def _recognize_all(parsers, pos : int, tar ):
+    for p in parsers:
+        pos = p._recognize(pos, tar)
+        if pos is None:
+            return None
+    return pos
+
+def walk(parser : Parser):
+    '''Yields every parser reachable from `parser` exactly once.'''
+    seen = set()
+    stack = [parser]
+    while stack:
+        p = stack.pop()
+        if id(p) in seen:
+            continue
+        seen.add(id(p))
+        yield p
+        stack.extend(reversed(p._children()))
+
 class ParseError(Exception):
+    # `furthest` and `expected` are set on the error of a failed parse: the
+    # furthest position a parser failed at, and the names of those parsers.
+    furthest = None
+    expected = ()
+
     def __init__(self, start : int, end : int, msg : str, parser : Parser) -> None:
         self.start = start
         self.end = end
@@ -64,73 +468,280 @@ class ParseError(Exception):
     def __str__(self):
         return self.msg
 
+    def __reduce__(self):
+        # `args` still holds the parser given to __init__: pickle only the
+        # attributes, so a `parser` replaced by its index is all that is sent.
+        return (self.__class__, (self.start, self.end, self.msg, None), self.__dict__)
+
+    def shifted(self, offset : int):
+        '''The same error, at positions `offset` further.'''
+        err = ParseError(self.start + offset, self.end + offset, self.msg, self.parser)
+        if self.furthest is not None:
+            (err.furthest, err.expected) = (self.furthest + offset, self.expected)
+        return err
+
+    def explain(self, tar, lines : LineIndex = None) -> str:
+        '''A message pointing at the furthest failure, with its line and
+        column in `tar` (a text or binary target). Pass a LineIndex of
+        `tar` to reuse it across errors.'''
+        if self.furthest is None:
+            return self.msg
+        pos = self.furthest
+        (line, column) = (lines or LineIndex(tar)).locate(pos)
+        got = repr(tar[pos:pos + 1]) if pos < len(tar) else 'EOF'
+        expected = self.expected[0] if len(self.expected) == 1 else \
+            'one of ' + ', '.join(self.expected)
+        return 'Line {}, column {}: expected {} but got {}'.format(line, column, expected, got)
+
 class Sequence(Parser):
+    _caches = (('_plan', (-1, None)),)
 
     def __init__(self, *parsers) -> None:
         super().__init__()
         self.parsers = list(parsers)
+        self._plan = (-1, None)
+
+    def _children(self):
+        return self.parsers
+
+    def _first(self, seen : set):
+        return _first_of_sequence(self.parsers, seen)
 
     def __add__(self, other):
-        self.parsers.append(other)
-        return self
+        # A new node, as this one may be part of another rule.
+        return Sequence(*self.parsers, other)
 
-    def run(self, pos : int, tar ):
+    def _parse(self, pos : int, tar ):
+        if self._plan[0] != _generation:
+            self._plan = (_generation, _fuse(self.parsers, 'all'))
+        steps = self._plan[1]
         data = list()
-        for p in self.parsers:
-            (pos, res) = p.run(pos, tar)
-            data.append(res)
+        if steps is None:
+            for p in self.parsers:
+                res = p._parse(pos, tar)
+                if res is None:
+                    return None
+                (pos, res) = res
+                data.append(res)
+            return (pos, data)
+        for p in steps:
+            res = p._parse(pos, tar)
+            if res is None:
+                return None
+            (pos, res) = res
+            if p.__class__ is _Fused:
+                data.extend(res)
+            else:
+                data.append(res)
         return (pos, data)
 
+    def _recognize(self, pos : int, tar ):
+        if self._plan[0] != _generation:
+            self._plan = (_generation, _fuse(self.parsers, 'all'))
+        return _recognize_all(self._plan[1] or self.parsers, pos, tar)
+
 class KeepRight(Parser):
+    _caches = (('_plan', (-1, None)),)
 
     def __init__(self, *parsers) -> None:
         super().__init__()
         self.parsers = list(parsers)
+        self._plan = (-1, None)
+
+    def _children(self):
+        return self.parsers
+
+    def _first(self, seen : set):
+        return _first_of_sequence(self.parsers, seen)
 
     def __rshift__(self, other):
-        self.parsers.append(other)
-        return self
+        # A new node, as this one may be part of another rule.
+        return KeepRight(*self.parsers, other)
 
-    def run(self, pos : int, tar ):
-        for p in self.parsers:
-            (pos, res) = p.run(pos, tar)
-        return (pos, res)
+    def _parse(self, pos : int, tar ):
+        if self._plan[0] != _generation:
+            self._plan = (_generation, _fuse(self.parsers, 'last'))
+        for p in self._plan[1] or self.parsers:
+            res = p._parse(pos, tar)
+            if res is None:
+                return None
+            pos = res[0]
+        return res
+
+    def _recognize(self, pos : int, tar ):
+        if self._plan[0] != _generation:
+            self._plan = (_generation, _fuse(self.parsers, 'last'))
+        return _recognize_all(self._plan[1] or self.parsers, pos, tar)
 
 class KeepLeft(Parser):
+    _caches = (('_plan', (-1, None)),)
 
     def __init__(self, *parsers) -> None:
         super().__init__()
         self.parsers = list(parsers)
+        self._plan = (-1, None)
+
+    def _children(self):
+        return self.parsers
+
+    def _first(self, seen : set):
+        return _first_of_sequence(self.parsers, seen)
 
     def __lshift__(self, other):
-        self.parsers.append(other)
-        return self
+        # A new node, as this one may be part of another rule.
+        return KeepLeft(*self.parsers, other)
 
-    def run(self, pos : int, tar ):
-        (pos, res) = self.parsers[0].run(pos, tar)
-        for p in self.parsers[1:]:
-            (pos, _) = p.run(pos, tar)
+    def _parse(self, pos : int, tar ):
+        if self._plan[0] != _generation:
+            self._plan = (_generation, _fuse(self.parsers, 'first'))
+        steps = self._plan[1] or self.parsers
+        res = steps[0]._parse(pos, tar)
+        if res is None:
+            return None
+        (pos, res) = res
+        for p in steps[1:]:
+            end = p._parse(pos, tar)
+            if end is None:
+                return None
+            pos = end[0]
         return (pos, res)
 
+    def _recognize(self, pos : int, tar ):
+        if self._plan[0] != _generation:
+            self._plan = (_generation, _fuse(self.parsers, 'first'))
+        return _recognize_all(self._plan[1] or self.parsers, pos, tar)
+
 class Choice(Parser):
+    _caches = (('_plan', (-1, None, None)), ('_jump', (None, None)))
 
     def __init__(self, *parsers) -> None:
         super().__init__()
         self.parsers = list(parsers)
+        self._plan = (-1, None, None)
+        self._jump = (None, None)
 
-    def __or__(self, other):
-        self.parsers.append(other)
-        return self
+    def _children(self):
+        return self.parsers
 
-    def run(self, pos : int, tar):
+    def _first(self, seen : set):
+        chars, nullable = set(), False
         for p in self.parsers:
+            (first, n) = p._first(seen)
+            if first is None:
+                return (None, True)
+            chars |= first
+            nullable = nullable or n
+        return (frozenset(chars), nullable)
+
+    def _dispatch(self):
+        # Maps each possible leading character to the alternatives that can
+        # start with it, keeping their order. Alternatives that cannot be
+        # analyzed or may match the empty string are tried for every key.
+        # Runs of plain Literal alternatives are merged into one trie.
+        from .atomic import Literal, Literals
+        parsers, run = [], []
+        for p in self.parsers + [None]:
+            if type(p) is Literal:
+                run.append(p)
+                continue
+            if len(run) >= TRIE_THRESHOLD:
+                parsers.append(Literals(*(l.literal for l in run)))
+            else:
+                parsers.extend(run)
+            run = []
+            if p is not None:
+                parsers.append(p)
+        firsts = [p._first(set()) for p in parsers]
+        always = tuple(p for p, (chars, nullable) in zip(parsers, firsts)
+                       if chars is None or nullable)
+        table = None
+        if len(always) < len(parsers):
+            keys = set().union(*(chars for chars, _ in firsts if chars is not None))
+            table = {k : tuple(p for p, (chars, nullable) in zip(parsers, firsts)
+                               if chars is None or nullable or k in chars) for k in keys}
+        self._plan = (_generation, table, always)
+
+    def __or__(self, other):
+        # A new node, as this one may be part of another rule.
+        return Choice(*self.parsers, other)
+
+    def _parse(self, pos : int, tar):
+        if self._plan[0] != _generation:
+            self._dispatch()
+        (_, table, always) = self._plan
+        if table is None:
+            parsers = self.parsers
+        elif tar.__class__ is str:
+            parsers = table.get(tar[pos], always) if pos < len(tar) else always
+        else:
+            parsers = self._select(pos, tar, table, always)
+        for p in parsers:
+            try:
+                res = p._parse(pos, tar)
+            except:
+                continue
+            if res is not None:
+                return res
+
+        state.failure = (self, pos)
+        if pos >= state.furthest:
+            state.expect(self, pos)
+        return None
+
+    def _recognize(self, pos : int, tar):
+        if self._plan[0] != _generation:
+            self._dispatch()
+        (_, table, always) = self._plan
+        if table is None:
+            parsers = self.parsers
+        elif tar.__class__ is str:
+            parsers = table.get(tar[pos], always) if pos < len(tar) else always
+        else:
+            parsers = self._select(pos, tar, table, always)
+        for p in parsers:
             try:
-                return p.run(pos, tar)
+                end = p._recognize(pos, tar)
             except:
                 continue
-            
+            if end is not None:
+                return end
+
+        state.failure = (self, pos)
+        if pos >= state.furthest:
+            state.expect(self, pos)
+        return None
+
+    def _select(self, pos : int, tar, table : dict, always : tuple):
+        # Token targets are keyed by token type; a TokenArray indexes a
+        # jump list with its integer kind codes directly.
+        if tar.__class__ is list:
+            if pos >= len(tar):
+                return always
+            try:
+                return table.get(tar[pos].type, always)
+            except AttributeError:
+                return self.parsers
+        codes = getattr(tar, 'codes', None)
+        if codes is None:
+            # Other token sequences (LazyTokens) are indexed, not measured.
+            try:
+                return table.get(tar[pos].type, always)
+            except IndexError:
+                return always
+            except (AttributeError, TypeError):
+                return self.parsers
+        kinds = tar.kinds
+        if pos >= len(kinds):
+            return always
+        (owner, jump) = self._jump
+        if owner is not codes or jump[-1] is not table:
+            jump = [table.get(name, always) for name in tar.names] + [table]
+            self._jump = (codes, jump)
+        return jump[kinds[pos]]
+
+    def _error(self, pos : int, tar):
         msg = "No choice was left"
-        raise ParseError(pos, pos, msg, self)
+        return ParseError(pos, pos, msg, self)
 
 class Many(Parser):
 
@@ -138,16 +749,38 @@ class Many(Parser):
         super().__init__()
         self.parser = parser
 
-    def run(self, pos : int, tar ):
+    def _children(self):
+        return (self.parser,)
+
+    def _first(self, seen : set):
+        return (self.parser._first(seen)[0], True)
+
+    def _parse(self, pos : int, tar ):
         data = list()
+        parser = self.parser
         while True:
             try:
-                (pos, res) = self.parser.run(pos, tar)
+                res = parser._parse(pos, tar)
             except:
                 break
+            if res is None:
+                break
+            (pos, res) = res
             data.append(res)
         return (pos, data)
 
+    def _recognize(self, pos : int, tar ):
+        parser = self.parser
+        while True:
+            try:
+                end = parser._recognize(pos, tar)
+            except:
+                break
+            if end is None:
+                break
+            pos = end
+        return pos
+
 class SepBy(Parser):
 
     def __init__(self, tar : Parser, sep : Parser) -> None:
@@ -155,29 +788,162 @@ class SepBy(Parser):
         self.tar = tar
         self.sep = sep
 
-    def run(self, pos : int, tar ):
-        (pos, res) = self.tar.run(pos, tar)
+    def _children(self):
+        return (self.tar, self.sep)
+
+    def _first(self, seen : set):
+        return self.tar._first(seen)
+
+    def _parse(self, pos : int, tar ):
+        res = self.tar._parse(pos, tar)
+        if res is None:
+            return None
+        (pos, res) = res
         data = [res]
         while True:
             try:
-                (pos, _) = self.sep.run(pos, tar)
+                end = self.sep._parse(pos, tar)
             except:
                 break
-            (pos, res) = self.tar.run(pos,tar)
+            if end is None:
+                break
+            res = self.tar._parse(end[0], tar)
+            if res is None:
+                return None
+            (pos, res) = res
             data.append(res)
-            
+
         return (pos, data)
 
+    def _recognize(self, pos : int, tar ):
+        pos = self.tar._recognize(pos, tar)
+        if pos is None:
+            return None
+        while True:
+            try:
+                end = self.sep._recognize(pos, tar)
+            except:
+                break
+            if end is None:
+                break
+            pos = self.tar._recognize(end, tar)
+            if pos is None:
+                return None
+        return pos
+
+class Fold(Parser):
+    '''Like Many, or SepBy with a separator, but combines the values as
+    they are parsed with `func(acc, value)`, starting from `init`, instead
+    of collecting them into a list. `init` is shared by every parse, so
+    `func` should return a new accumulator rather than modify it.'''
+
+    def __init__(self, parser : Parser, init, func, sep : Parser = None) -> None:
+        super().__init__()
+        self.parser = parser
+        self.init = init
+        self.func = func
+        self.sep = sep
+
+    def _children(self):
+        return (self.parser,) if self.sep is None else (self.parser, self.sep)
+
+    def _first(self, seen : set):
+        (first, nullable) = self.parser._first(seen)
+        return (first, True) if self.sep is None else (first, nullable)
+
+    def _parse(self, pos : int, tar ):
+        parser, func, acc = self.parser, self.func, self.init
+        if self.sep is not None:
+            res = parser._parse(pos, tar)
+            if res is None:
+                return None
+            (pos, res) = res
+            acc = func(acc, res)
+        while True:
+            if self.sep is not None:
+                try:
+                    end = self.sep._parse(pos, tar)
+                except:
+                    break
+                if end is None:
+                    break
+                res = parser._parse(end[0], tar)
+                if res is None:
+                    return None
+            else:
+                try:
+                    res = parser._parse(pos, tar)
+                except:
+                    break
+                if res is None:
+                    break
+            (pos, res) = res
+            acc = func(acc, res)
+        return (pos, acc)
+
+    def _recognize(self, pos : int, tar ):
+        parser, sep = self.parser, self.sep
+        if sep is not None:
+            pos = parser._recognize(pos, tar)
+            if pos is None:
+                return None
+        while True:
+            if sep is not None:
+                try:
+                    end = sep._recognize(pos, tar)
+                except:
+                    break
+                if end is None:
+                    break
+                end = parser._recognize(end, tar)
+                if end is None:
+                    return None
+            else:
+                try:
+                    end = parser._recognize(pos, tar)
+                except:
+                    break
+                if end is None:
+                    break
+            pos = end
+        return pos
+
 class Lazy(Parser):
 
     def __init__(self) -> None:
         super().__init__()
         self._parser = None
     
-    def run(self, pos : int, tar ):
+    def _parse(self, pos : int, tar ):
         if not self._parser :
-            raise ParseError(pos, pos, "Lazy Parser was not set!", self)
-        return self._parser.run(pos, tar)
+            state.failure = (self, pos)
+            if pos >= state.furthest:
+                state.expect(self, pos)
+            return None
+        return self._parser._parse(pos, tar)
+
+    def _recognize(self, pos : int, tar ):
+        if not self._parser :
+            state.failure = (self, pos)
+            if pos >= state.furthest:
+                state.expect(self, pos)
+            return None
+        return self._parser._recognize(pos, tar)
+
+    def _error(self, pos : int, tar ):
+        return ParseError(pos, pos, "Lazy Parser was not set!", self)
+
+    def _children(self):
+        return (self._parser,) if self._parser else ()
+
+    def _first(self, seen : set):
+        if not self._parser or self in seen:
+            return (None, True)
+        seen.add(self)
+        try:
+            return self._parser._first(seen)
+        finally:
+            seen.discard(self)
 
     @property
     def p(self):
@@ -186,6 +952,7 @@ class Lazy(Parser):
     @p.setter
     def p(self, value):
         self._parser = value
+        _changed()
         
 class Map(Parser):
 
@@ -193,17 +960,34 @@ class Map(Parser):
         super().__init__()
         self.parser = parser
         self.funcs = [func]
+
+    def _children(self):
+        return (self.parser,)
+
+    def _first(self, seen : set):
+        return self.parser._first(seen)
     
     def map(self, func) -> Parser:
-        self.funcs.append(func)
-        return self
+        new = Map(self.parser, func)
+        new.funcs = self.funcs + [func]
+        return new
 
-    def run(self, pos : int, tar ):
-        (pos, res) = self.parser.run(pos, tar)
-        for f in self.funcs:
-            res = f(res)
+    def _parse(self, pos : int, tar ):
+        res = self.parser._parse(pos, tar)
+        if res is None:
+            return None
+        (pos, res) = res
+        try:
+            for f in self.funcs:
+                res = f(res)
+        except ParseError as e:
+            state.failure = (e, None)
+            return None
         return (pos, res)
 
+    def _recognize(self, pos : int, tar ):
+        return self.parser._recognize(pos, tar)
+
 class ErrMap(Parser):
 
     def __init__(self, parser : Parser, func) -> None:
@@ -211,9 +995,182 @@ class ErrMap(Parser):
         self.parser = parser
         self.func = func
 
-    def run(self, pos : int, tar ):
+    def _children(self):
+        return (self.parser,)
+
+    def _parse(self, pos : int, tar ):
+        result = self.parser._parse(pos, tar)
+        if result is None:
+            try:
+                result = self.func(failure_error(tar))
+            except ParseError as e:
+                state.failure = (e, None)
+                return None
+        return result
+
+    def _recognize(self, pos : int, tar ):
+        end = self.parser._recognize(pos, tar)
+        if end is not None:
+            return end
         try:
-            result = self.parser.run(pos, tar)
+            res = self.func(failure_error(tar))
         except ParseError as e:
-            result = self.func(e)
-        return result
+            state.failure = (e, None)
+            return None
+        return res[0]
+
+class Commit(Parser):
+    '''Parses `parser` and promises never to backtrack before where it
+    ended. A target that buffers its items (LazyTokens) releases the ones
+    behind that point.'''
+
+    def __init__(self, parser : Parser) -> None:
+        super().__init__()
+        self.parser = parser
+
+    def _children(self):
+        return (self.parser,)
+
+    def _first(self, seen : set):
+        return self.parser._first(seen)
+
+    def _parse(self, pos : int, tar ):
+        res = self.parser._parse(pos, tar)
+        if res is not None:
+            release = getattr(tar, 'release', None)
+            if release is not None:
+                release(res[0])
+        return res
+
+    def _recognize(self, pos : int, tar ):
+        end = self.parser._recognize(pos, tar)
+        if end is not None:
+            release = getattr(tar, 'release', None)
+            if release is not None:
+                release(end)
+        return end
+
+def _keyed(entries : list):
+    # (table, always, entries) of operator entries, keyed by the first
+    # characters of their parsers like the dispatch table of a Choice.
+    firsts = [e[0]._first(set()) for e in entries]
+    always = tuple(e for e, (chars, nullable) in zip(entries, firsts) if chars is None or nullable)
+    if len(always) == len(entries):
+        return (None, always, entries)
+    keys = set().union(*(chars for chars, _ in firsts if chars is not None))
+    table = {k : tuple(e for e, (chars, nullable) in zip(entries, firsts)
+                       if chars is None or nullable or k in chars) for k in keys}
+    return (table, always, entries)
+
+class Expression(Parser):
+    '''Operators over `operand`, parsed by precedence climbing in a single
+    loop with a stack of pending operators, instead of one rule per
+    precedence level.
+
+    `infix` holds (op, precedence, assoc, func) entries, `assoc` being
+    'left' or 'right', and `prefix` and `postfix` hold (op, precedence,
+    func) entries. A higher precedence binds tighter. Values are built as
+    operators are reduced, with `func(left, right)` for infix operators and
+    `func(value)` for the others; the values of the operators themselves
+    are not used. Operators of each kind are tried in order, so `**` goes
+    before `*`. As with SepBy, an infix operator must be followed by an
+    operand.'''
+    _caches = (('_plan', (-1, None, None, None)),)
+
+    def __init__(self, operand : Parser, infix = (), prefix = (), postfix = ()) -> None:
+        super().__init__()
+        for (_, _, assoc, _) in infix:
+            if assoc not in ('left', 'right'):
+                raise ValueError('Associativity should be \'left\' or \'right\', not {!r}'.format(assoc))
+        self.operand = operand
+        self.infix = list(infix)
+        self.prefix = list(prefix)
+        self.postfix = list(postfix)
+        self._plan = (-1, None, None, None)
+
+    def _children(self):
+        return (self.operand,) + tuple(e[0] for e in self.prefix + self.infix + self.postfix)
+
+    def _first(self, seen : set):
+        (chars, nullable) = self.operand._first(seen)
+        if chars is None:
+            return (None, True)
+        chars = set(chars)
+        for entry in self.prefix:
+            (first, n) = entry[0]._first(seen)
+            if first is None or n:
+                return (None, True)
+            chars |= first
+        return (frozenset(chars), nullable)
+
+    def _operator(self, keyed : tuple, pos : int, tar ):
+        (table, always, entries) = keyed
+        if table is None:
+            entries = always
+        elif tar.__class__ is str:
+            entries = table.get(tar[pos], always) if pos < len(tar) else always
+        for entry in entries:
+            try:
+                end = entry[0]._recognize(pos, tar)
+            except:
+                continue
+            if end is not None:
+                return (end, entry)
+        return None
+
+    def _climb(self, pos : int, tar, build : bool):
+        if self._plan[0] != _generation:
+            self._plan = (_generation, _keyed(self.infix), _keyed(self.prefix), _keyed(self.postfix))
+        (_, infix, prefix, postfix) = self._plan
+        operand, values, ops = self.operand, [], []
+
+        def reduce():
+            (_, func, binary) = ops.pop()
+            if binary:
+                right = values.pop()
+                values[-1] = func(values[-1], right) if build else None
+            else:
+                values[-1] = func(values[-1]) if build else None
+
+        while True:
+            res = self._operator(prefix, pos, tar) if prefix[2] else None
+            while res is not None:
+                (pos, (_, prec, func)) = res
+                ops.append((prec, func, False))
+                res = self._operator(prefix, pos, tar)
+            if build:
+                res = operand._parse(pos, tar)
+                if res is None:
+                    return None
+                (pos, value) = res
+            else:
+                pos = operand._recognize(pos, tar)
+                if pos is None:
+                    return None
+                value = None
+            values.append(value)
+            res = self._operator(postfix, pos, tar) if postfix[2] else None
+            while res is not None:
+                (pos, (_, prec, func)) = res
+                while ops and ops[-1][0] >= prec:
+                    reduce()
+                values[-1] = func(values[-1]) if build else None
+                res = self._operator(postfix, pos, tar)
+            res = self._operator(infix, pos, tar) if infix[2] else None
+            if res is None:
+                break
+            (pos, (_, prec, assoc, func)) = res
+            left = assoc == 'left'
+            while ops and (ops[-1][0] > prec or (left and ops[-1][0] == prec)):
+                reduce()
+            ops.append((prec, func, True))
+        while ops:
+            reduce()
+        return (pos, values[0])
+
+    def _parse(self, pos : int, tar ):
+        return self._climb(pos, tar, True)
+
+    def _recognize(self, pos : int, tar ):
+        res = self._climb(pos, tar, False)
+        return None if res is None else res[0]
@@ -0,0 +1,210 @@
+from .combinators import (Parser, ParseError, Sequence, KeepLeft, KeepRight,
+                          Choice, Many, SepBy, Lazy, Map)
+from .atomic import (Char, Literal, Regex)
+
+INLINE_LIMIT = 24
+'''Largest subtree (in nodes) that is inlined into its parent's function.'''
+
+class Compiled(object):
+    '''A grammar compiled into plain Python functions.
+
+    Calling it behaves like calling the original parser. Only `str` targets
+    take the compiled path; any other target, and every failure, is handed
+    to the original parser so errors stay exactly the same.'''
+
+    def __init__(self, parser : Parser, source : str, func) -> None:
+        self.parser = parser
+        self.source = source
+        self.func = func
+
+    def __call__(self, stream, idx = 0):
+        if isinstance(stream, str):
+            res = self.func(idx, stream)
+            if res is not None:
+                return res
+        return self.parser(stream, idx)
+
+def compile_parser(parser : Parser) -> Compiled:
+    emitter = _Emitter()
+    root = emitter.function(parser)
+    source = emitter.source()
+    env = dict(emitter.env)
+    exec(compile(source, '<paco:{}>'.format(parser.name), 'exec'), env)
+    for (table, names, always) in emitter.tables:
+        env[table] = {k : tuple(env[f] for f in fs) for k, fs in names.items()}
+        env[always] = tuple(env[f] for f in env[always])
+    return Compiled(parser, source, env[root])
+
+def _target(parser):
+    seen = set()
+    while isinstance(parser, Lazy) and parser.p and id(parser) not in seen:
+        seen.add(id(parser))
+        parser = parser.p
+    return parser
+
+def _size(parser, limit):
+    stack, count = [parser], 0
+    while stack and count <= limit:
+        p = stack.pop()
+        count += 1
+        if type(p) in (Sequence, KeepLeft, KeepRight, Map):
+            stack.extend(p._children())
+    return count
+
+class _Emitter(object):
+
+    def __init__(self) -> None:
+        self.names = {}
+        self.env = {'ParseError' : ParseError}
+        self.queue = []
+        self.tables = []
+        self.chunks = []
+        self.temps = 0
+
+    def source(self) -> str:
+        while self.queue:
+            self.chunks.append(self.define(*self.queue.pop()))
+        return '\n'.join(self.chunks)
+
+    def const(self, prefix : str, value) -> str:
+        name = '_{}{}'.format(prefix, len(self.env))
+        self.env[name] = value
+        return name
+
+    def temp(self) -> str:
+        self.temps += 1
+        return 'v{}'.format(self.temps)
+
+    def function(self, parser) -> str:
+        parser = _target(parser)
+        if id(parser) not in self.names:
+            name = 'f{}'.format(len(self.names))
+            self.names[id(parser)] = name
+            self.queue.append((name, parser))
+        return self.names[id(parser)]
+
+    def inlinable(self, parser) -> bool:
+        if type(parser) in (Char, Literal, Regex):
+            return True
+        if type(parser) in (Sequence, KeepLeft, KeepRight, Map):
+            return _size(parser, INLINE_LIMIT) <= INLINE_LIMIT
+        return False
+
+    def define(self, name : str, parser) -> str:
+        self.temps = 0
+        out = ['def {}(pos, tar):'.format(name)]
+        kind = type(parser)
+        if kind is Choice:
+            parser._dispatch()
+            if parser._plan[1] is not None:
+                self.dispatch(parser, out)
+            else:
+                for alt in parser.parsers:
+                    out.append('    try:')
+                    out.append('        while True:')
+                    out.append('            q = pos')
+                    val = self.inline(alt, 'q', 'break', out, 3)
+                    out.append('            return (q, {})'.format(val))
+                    out.append('    except Exception:')
+                    out.append('        pass')
+                out.append('    return None')
+        elif kind is Many:
+            out.append('    data = []')
+            out.append('    while True:')
+            out.append('        q = pos')
+            out.append('        try:')
+            val = self.inline(parser.parser, 'q', 'break', out, 3)
+            out.append('        except Exception:')
+            out.append('            break')
+            out.append('        pos = q')
+            out.append('        data.append({})'.format(val))
+            out.append('    return (pos, data)')
+        elif kind is SepBy:
+            val = self.inline(parser.tar, 'pos', 'return None', out, 1)
+            out.append('    data = [{}]'.format(val))
+            out.append('    while True:')
+            out.append('        q = pos')
+            out.append('        try:')
+            self.inline(parser.sep, 'q', 'break', out, 3, keep = False)
+            out.append('        except Exception:')
+            out.append('            break')
+            val = self.inline(parser.tar, 'q', 'return None', out, 2)
+            out.append('        pos = q')
+            out.append('        data.append({})'.format(val))
+            out.append('    return (pos, data)')
+        elif kind in (Char, Literal, Regex, Sequence, KeepLeft, KeepRight, Map):
+            val = self.inline(parser, 'pos', 'return None', out, 1, True)
+            out.append('    return (pos, {})'.format(val))
+        else:
+            node = self.const('n', parser)
+            out.append('    return {}._parse(pos, tar)'.format(node))
+        return '\n'.join(out) + '\n'
+
+    def dispatch(self, parser, out : list) -> None:
+        # The alternatives are looked up by the next character in the FIRST
+        # table of the Choice, tries included. The table holds function
+        # names until the functions exist, see compile_parser.
+        (_, keys, always) = parser._plan
+        names = {k : tuple(self.function(p) for p in alts) for k, alts in keys.items()}
+        table = self.const('d', names)
+        always = self.const('a', tuple(self.function(p) for p in always))
+        self.tables.append((table, names, always))
+        out.append('    alts = {}.get(tar[pos], {}) if pos < len(tar) else {}'.format(table, always, always))
+        out.append('    for alt in alts:')
+        out.append('        try:')
+        out.append('            r = alt(pos, tar)')
+        out.append('        except Exception:')
+        out.append('            continue')
+        out.append('        if r is not None:')
+        out.append('            return r')
+        out.append('    return None')
+
+    def inline(self, parser, pv : str, fail : str, out : list, depth : int, top = False, keep = True) -> str:
+        pad = '    ' * depth
+        kind = type(parser)
+        if not top and not self.inlinable(parser):
+            val = self.temp()
+            out.append('{}r = {}({}, tar)'.format(pad, self.function(parser), pv))
+            out.append('{}if r is None: {}'.format(pad, fail))
+            out.append('{}{}, {} = r'.format(pad, pv, val))
+            return val
+        if kind is Char:
+            if len(parser.char) != 1:
+                out.append('{}{}'.format(pad, fail))
+            else:
+                out.append('{}if not tar.startswith({!r}, {}): {}'.format(pad, parser.char, pv, fail))
+                out.append('{}{} += 1'.format(pad, pv))
+            return repr(parser.char)
+        if kind is Literal:
+            out.append('{}if not tar.startswith({!r}, {}): {}'.format(pad, parser.literal, pv, fail))
+            out.append('{}{} += {}'.format(pad, pv, parser.length))
+            return repr(parser.literal)
+        if kind is Regex:
+            match = self.const('r', parser.rule.match)
+            out.append('{}m = {}(tar, {})'.format(pad, match, pv))
+            out.append('{}if m is None: {}'.format(pad, fail))
+            if not keep:
+                out.append('{}{} = m.end()'.format(pad, pv))
+                return 'None'
+            val = self.temp()
+            out.append('{}{}, {} = m.end(), m.group()'.format(pad, pv, val))
+            return val
+        if kind is Map:
+            # A function raising ParseError fails the parser, as in Map._parse.
+            val = self.inline(parser.parser, pv, fail, out, depth)
+            out.append('{}try:'.format(pad))
+            for f in parser.funcs:
+                res = self.temp()
+                out.append('{}    {} = {}({})'.format(pad, res, self.const('m', f), val))
+                val = res
+            out.append('{}except ParseError: {}'.format(pad, fail))
+            return val
+        last = len(parser.parsers) - 1
+        vals = [self.inline(p, pv, fail, out, depth, keep = keep and (kind is Sequence
+                            or (kind is KeepLeft and i == 0) or (kind is KeepRight and i == last)))
+                for i, p in enumerate(parser.parsers)]
+        if kind is Sequence:
+            return '[{}]'.format(', '.join(vals))
+        if kind is KeepLeft:
+            return vals[0]
+        return vals[-1]
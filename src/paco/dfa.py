@@ -0,0 +1,230 @@
+import re
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:
+    import sre_parse, sre_constants
+
+_CATEGORIES = {
+    sre_constants.CATEGORY_DIGIT : r'\d', sre_constants.CATEGORY_NOT_DIGIT : r'\D',
+    sre_constants.CATEGORY_SPACE : r'\s', sre_constants.CATEGORY_NOT_SPACE : r'\S',
+    sre_constants.CATEGORY_WORD : r'\w', sre_constants.CATEGORY_NOT_WORD : r'\W',
+}
+_REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+# Flags that change which characters a class matches.
+_CHAR_FLAGS = re.IGNORECASE | re.DOTALL | re.ASCII | re.LOCALE
+# Edges of a state tried before the loop of runs is given up on.
+LOOP_EDGES = 4
+
+def _char(code : int) -> str:
+    return '\\U{:08x}'.format(code)
+
+def _class(op, av) -> str:
+    '''Source of a one character regex for a LITERAL, NOT_LITERAL, ANY or
+    IN item.'''
+    if op is sre_constants.LITERAL:
+        return '[{}]'.format(_char(av))
+    if op is sre_constants.NOT_LITERAL:
+        return '[^{}]'.format(_char(av))
+    if op is sre_constants.ANY:
+        return '.'
+    parts = []
+    for (kind, value) in av:
+        if kind is sre_constants.NEGATE:
+            parts.append('^')
+        elif kind is sre_constants.LITERAL:
+            parts.append(_char(value))
+        elif kind is sre_constants.RANGE:
+            parts.append('{}-{}'.format(_char(value[0]), _char(value[1])))
+        elif kind is sre_constants.CATEGORY and value in _CATEGORIES:
+            parts.append(_CATEGORIES[value])
+        else:
+            raise ValueError('Unsupported class item in a DFA lexer: {}'.format(kind))
+    return '[{}]'.format(''.join(parts))
+
+class _NFA(object):
+    # Thompson automaton of all rules: `edges[s]` holds (class, target)
+    # pairs, `eps[s]` the targets reached without input and `accept[s]`
+    # the index of the rule a state accepts, if any.
+
+    def __init__(self) -> None:
+        self.edges, self.eps, self.accept = [], [], []
+        self.classes = {}
+        self.matchers = []
+
+    def state(self) -> int:
+        self.edges.append([])
+        self.eps.append([])
+        self.accept.append(None)
+        return len(self.edges) - 1
+
+    def klass(self, source : str, flags : int) -> int:
+        key = (source, flags & _CHAR_FLAGS)
+        if key not in self.classes:
+            self.classes[key] = len(self.matchers)
+            self.matchers.append(re.compile(source, key[1]).match)
+        return self.classes[key]
+
+    def add(self, rule : str, index : int) -> int:
+        parsed = sre_parse.parse(rule)
+        # The global flags, `parsed.pattern` before Python 3.8.
+        flags = getattr(parsed, 'state', None) or parsed.pattern
+        start, end = self.state(), self.state()
+        self.items(parsed, flags.flags, start, end)
+        self.accept[end] = index
+        return start
+
+    def items(self, items, flags : int, start : int, end : int) -> None:
+        for item in items:
+            mid = self.state()
+            self.item(item, flags, start, mid)
+            start = mid
+        self.eps[start].append(end)
+
+    def item(self, item, flags : int, start : int, end : int) -> None:
+        (op, av) = item
+        if op in (sre_constants.LITERAL, sre_constants.NOT_LITERAL, sre_constants.ANY, sre_constants.IN):
+            self.edges[start].append((self.klass(_class(op, av), flags), end))
+        elif op is sre_constants.BRANCH:
+            for alt in av[1]:
+                self.items(alt, flags, start, end)
+        elif op is sre_constants.SUBPATTERN:
+            if len(av) == 4:
+                (_, add, remove, items) = av
+                flags = (flags | add) & ~remove
+            else:
+                items = av[1]
+            self.items(items, flags, start, end)
+        elif op in _REPEATS:
+            # Greedy or not makes no difference to the longest match.
+            (low, high, items) = av
+            for _ in range(low):
+                mid = self.state()
+                self.items(items, flags, start, mid)
+                start = mid
+            if high == sre_constants.MAXREPEAT:
+                loop = self.state()
+                self.eps[start].append(loop)
+                self.items(items, flags, loop, loop)
+                self.eps[loop].append(end)
+            else:
+                for _ in range(high - low):
+                    mid = self.state()
+                    self.eps[start].append(end)
+                    self.items(items, flags, start, mid)
+                    start = mid
+                self.eps[start].append(end)
+        else:
+            raise ValueError('Unsupported in a DFA lexer: {}'.format(op))
+
+    def closure(self, states) -> frozenset:
+        seen, todo = set(states), list(states)
+        while todo:
+            for t in self.eps[todo.pop()]:
+                if t not in seen:
+                    seen.add(t)
+                    todo.append(t)
+        return frozenset(seen)
+
+class _State(object):
+    # A set of NFA states. Transitions are built as characters are seen:
+    # `trans` maps a character to the next state, or None when no rule can
+    # go on. `loop`, once known, matches the run of characters that lead
+    # back to this state, so identifiers, numbers or blanks are crossed by
+    # one regex call.
+
+    __slots__ = ('nfa', 'accept', 'trans', 'loop')
+
+    def __init__(self, nfa : frozenset, accept) -> None:
+        self.nfa = nfa
+        self.accept = accept
+        self.trans = {}
+        self.loop = _UNKNOWN
+
+_UNKNOWN = object()
+
+class DFA(object):
+    '''A lazily built deterministic automaton of regexes, matching the
+    longest prefix any of them matches.
+
+    Ties go to the earliest regex. Only regular constructs are supported:
+    classes, alternation, groups and repeats, but no anchors, lookarounds
+    or backreferences.'''
+
+    def __init__(self, rules) -> None:
+        self._nfa = _NFA()
+        starts = [self._nfa.add(rule, i) for i, rule in enumerate(rules)]
+        self._states = {}
+        self.start = self._state(self._nfa.closure(starts))
+
+    def _state(self, nfa : frozenset) -> _State:
+        state = self._states.get(nfa)
+        if state is None:
+            accepts = [self._nfa.accept[s] for s in nfa if self._nfa.accept[s] is not None]
+            state = self._states[nfa] = _State(nfa, min(accepts) if accepts else None)
+        return state
+
+    def _targets(self, state : _State, classes) -> set:
+        return {t for s in state.nfa for (k, t) in self._nfa.edges[s] if k in classes}
+
+    def step(self, state : _State, char : str):
+        matchers = self._nfa.matchers
+        classes = {k for s in state.nfa for (k, _) in self._nfa.edges[s] if matchers[k](char)}
+        targets = self._targets(state, classes)
+        nxt = self._state(self._nfa.closure(targets)) if targets else None
+        state.trans[char] = nxt
+        return nxt
+
+    def loop(self, state : _State):
+        # A character leads back to `state` depending only on which of the
+        # classes of its edges it is in, so each such combination is an
+        # alternative of the loop.
+        state.loop = None
+        classes = sorted({k for s in state.nfa for (k, _) in self._nfa.edges[s]})
+        if not classes or len(classes) > LOOP_EDGES:
+            return None
+        keys = [key for key, k in self._nfa.classes.items() if k in classes]
+        if len({flags for _, flags in keys}) > 1:
+            return None
+        sources = {k : source for (source, _), k in self._nfa.classes.items() if k in classes}
+        alts = []
+        for mask in range(1, 1 << len(classes)):
+            chosen = {k for i, k in enumerate(classes) if mask >> i & 1}
+            if self._nfa.closure(self._targets(state, chosen)) != state.nfa:
+                continue
+            if len(chosen) == len(classes) == 1:
+                alts.append(sources[classes[0]])
+                continue
+            alts.append(''.join(('(?={})' if k in chosen else '(?!{})').format(sources[k])
+                                for k in classes) + '(?s:.)')
+        if alts:
+            state.loop = re.compile('(?:{})*'.format('|'.join(alts)), keys[0][1]).match
+        return state.loop
+
+    def scan(self, text : str, pos : int = 0):
+        '''Yields the (rule index, start, end) of consecutive longest
+        matches from `pos`. Raises on a position no rule matches.'''
+        start, size, unknown = self.start, len(text), _UNKNOWN
+        while pos < size:
+            state, best, end, i = start, None, pos, pos
+            while i < size:
+                c = text[i]
+                nxt = state.trans.get(c, unknown)
+                if nxt is unknown:
+                    nxt = self.step(state, c)
+                if nxt is None:
+                    break
+                state = nxt
+                i += 1
+                loop = state.loop
+                if loop is not None:
+                    if loop is unknown:
+                        loop = self.loop(state)
+                    if loop is not None:
+                        i = loop(text, i).end()
+                if state.accept is not None:
+                    best, end = state.accept, i
+            if best is None:
+                raise Exception('Unrecognized character \'{}\' @{}'.format(text[pos], pos))
+            yield (best, pos, end)
+            pos = end
@@ -0,0 +1,309 @@
+import bisect
+import re
+import sys
+from . import combinators
+from .combinators import (Parser, Choice, Sequence, KeepLeft, KeepRight, walk, parse_error, _prepare)
+from .atomic import (Char, Literal, Literals, Regex, Tok, sre_parse, sre_constants)
+from .packrat import Memo
+from .state import state
+
+_REPEATS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT,
+            getattr(sre_constants, 'POSSESSIVE_REPEAT', None)}
+
+def _regex_chars(items, ranges : list) -> bool:
+    '''Collects the ranges of the characters parsed regex items can consume
+    or look ahead at; False when they are unbounded or unknown.'''
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            ranges.append((av, av))
+        elif op is sre_constants.IN:
+            for kind, arg in av:
+                if kind is sre_constants.LITERAL:
+                    ranges.append((arg, arg))
+                elif kind is sre_constants.RANGE:
+                    ranges.append(arg)
+                else:
+                    return False
+        elif op is sre_constants.SUBPATTERN:
+            if av[1] & re.IGNORECASE or not _regex_chars(av[-1], ranges):
+                return False
+        elif op is getattr(sre_constants, 'ATOMIC_GROUP', None):
+            if not _regex_chars(av, ranges):
+                return False
+        elif op is sre_constants.BRANCH:
+            if not all(_regex_chars(branch, ranges) for branch in av[1]):
+                return False
+        elif op in _REPEATS:
+            if not _regex_chars(av[2], ranges):
+                return False
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            if av[0] < 0 or not _regex_chars(av[1], ranges):
+                return False
+        elif op is sre_constants.GROUPREF_EXISTS:
+            if not all(_regex_chars(branch, ranges) for branch in av[1:] if branch):
+                return False
+        elif op not in (sre_constants.AT, sre_constants.GROUPREF):
+            return False
+    return True
+
+def _run_of(rule):
+    '''A regex matching the longest run of characters `rule` could look at,
+    or None when any character could be part of a match.'''
+    if rule.flags & re.IGNORECASE:
+        return None
+    ranges = []
+    if not _regex_chars(sre_parse.parse(rule.pattern, rule.flags), ranges):
+        return None
+    chars = ''.join(re.escape(chr(lo)) if lo == hi else
+                    '{}-{}'.format(re.escape(chr(lo)), re.escape(chr(hi)))
+                    for lo, hi in ranges)
+    run = '[{}]*'.format(chars) if chars else ''
+    return re.compile(run.encode('latin-1') if isinstance(rule.pattern, bytes) else run)
+
+class _ExtentMemo(Memo):
+    '''Memo table that also records, for every entry, the end of the
+    region of the target its parser examined, so that entries an edit
+    cannot have changed survive it.
+
+    Entries before the gap (the offset of the last edit) are keyed by their
+    position; entries after it are keyed, and hold positions, relative to
+    the end of the target, so an edit only touches the entries between the
+    previous gap and itself. An edit may also change entries before it that
+    examined text past it; those are found lazily, by comparing the end of
+    what they examined with the lowest offset edited since they were
+    stored.'''
+
+    def __init__(self, margin : int) -> None:
+        super().__init__()
+        self.margin = margin
+        self.runs = {}
+        self.tries = {}
+        self.clear()
+
+    def clear(self) -> None:
+        super().clear()
+        self.reach = 0
+        self.gap = sys.maxsize
+        self.size = 0
+        self.version = 0
+        # (version, offset) of the edits that are the lowest edited since.
+        self.edits = []
+
+    def install(self, parsers, tar) -> None:
+        self.tar = tar
+        self.reach = 0
+        self.size = len(tar) + 1
+        for p in parsers:
+            if '_parse' in p.__dict__:
+                continue
+            if type(p) in (Sequence, KeepLeft, KeepRight):
+                # A fused plan matches its atoms without their memo entries
+                # seeing it, which would hide what they examined.
+                p._plan = (combinators._generation, None)
+            p._parse = self.wrap(p, p._parse)
+            self._installed.append(p)
+
+    def uninstall(self) -> None:
+        for p in self._installed:
+            if type(p) in (Sequence, KeepLeft, KeepRight):
+                p._plan = (-1, None)
+        super().uninstall()
+
+    def wrap(self, parser, parse):
+        table = self.tables.setdefault(parser, {})
+        leaf = not parser._children()
+
+        def memo_parse(pos : int, tar):
+            if tar is not self.tar:
+                return parse(pos, tar)
+            if pos < self.gap:
+                entry = table.get(pos)
+                if entry is not None and entry[3] != self.version and not self.fresh(entry):
+                    entry = None
+            else:
+                entry = table.get(pos - self.size)
+                if entry is not None:
+                    entry = self.moved(entry, self.size)
+            if entry is None:
+                outer, self.reach = self.reach, pos + 1
+                if not leaf:
+                    # The furthest failures of the entry are recorded on
+                    # their own, to be replayed when it is reused.
+                    furthest, expected = state.furthest, state.expected
+                    state.reset()
+                try:
+                    res = parse(pos, tar)
+                except Exception:
+                    self.reach = len(tar)
+                    raise
+                finally:
+                    reach, self.reach = self.reach, outer
+                    if not leaf:
+                        seen = (state.furthest, state.expected)
+                        (state.furthest, state.expected) = (furthest, expected)
+                        self.replay(seen)
+                failure = None if res is not None else state.failure
+                entry = (res, failure, max(reach, self.extent(parser, leaf, pos, res, tar)), self.version,
+                         None if leaf else seen)
+                if not leaf and (failure is None or failure[1] is not None):
+                    # Leaves are cheaper to run again than to keep, and errors
+                    # raised by user code hold positions of their own.
+                    if pos < self.gap:
+                        table[pos] = entry
+                    else:
+                        table[pos - self.size] = self.moved(entry, -self.size)
+            else:
+                self.replay(entry[4])
+            res, failure, end = entry[:3]
+            if end > self.reach:
+                self.reach = end
+            if res is None:
+                state.failure = failure
+            return res
+
+        return memo_parse
+
+    def extent(self, parser, leaf : bool, pos : int, res, tar) -> int:
+        kind = type(parser)
+        if kind is Char or kind is Tok:
+            return pos + 1
+        if kind is Literal or kind is Literals:
+            return pos + parser.length
+        if kind is Choice:
+            # Runs of literals merged into a trie are not in walk(), so
+            # their memo entries cannot report what they examined.
+            return pos + max(1, self.merged(parser))
+        if not leaf:
+            # Composites report what their children examined.
+            return pos + 1
+        if kind is Regex:
+            # A regex cannot look past the first character it could not
+            # consume, a greedy repetition or a failed alternative may look
+            # up to that one however.
+            if parser not in self.runs:
+                self.runs[parser] = _run_of(parser.rule)
+            run = self.runs[parser]
+            if run is not None:
+                return run.match(tar, pos).end() + 1
+        if res is not None:
+            return res[0] + self.margin
+        return len(tar)
+
+    def merged(self, parser) -> int:
+        '''Length of the longest trie `parser` merged its literals into.'''
+        plan = parser._plan
+        cached = self.tries.get(parser)
+        if cached is None or cached[0] is not plan:
+            own = set(map(id, parser.parsers))
+            alts = [p for ps in (plan[1] or {}).values() for p in ps] + list(plan[2] or ())
+            cached = self.tries[parser] = (plan, max((p.length for p in alts
+                if type(p) is Literals and id(p) not in own), default=0))
+        return cached[1]
+
+    @staticmethod
+    def moved(entry, delta : int):
+        res, failure, end, version, (furthest, expected) = entry
+        if res is not None:
+            res = (res[0] + delta, res[1])
+        else:
+            failure = (failure[0], failure[1] + delta)
+        if expected is not None:
+            furthest += delta
+        return (res, failure, end + delta, version, (furthest, expected))
+
+    @staticmethod
+    def replay(seen) -> None:
+        '''Adds the furthest failures an entry recorded to the parse's.'''
+        (furthest, expected) = seen
+        if expected is None or furthest < state.furthest:
+            return
+        if furthest > state.furthest:
+            (state.furthest, state.expected) = (furthest, dict(expected))
+        else:
+            state.expected.update(expected)
+
+    def fresh(self, entry) -> bool:
+        i = bisect.bisect_right(self.edits, (entry[3], sys.maxsize))
+        return i == len(self.edits) or entry[2] <= self.edits[i][1]
+
+    def shift(self, offset : int, deleted : int, inserted : int) -> None:
+        '''Moves the gap to an edit replacing `deleted` characters at
+        `offset` with `inserted` characters.'''
+        size = self.size
+        for table in self.tables.values():
+            if offset < self.gap:
+                for pos in _keys(table, offset, min(self.gap, size)):
+                    entry = table.pop(pos)
+                    if entry[3] == self.version or self.fresh(entry):
+                        table[pos - size] = self.moved(entry, -size)
+            else:
+                for pos in _keys(table, self.gap - size, offset - size):
+                    entry = self.moved(table.pop(pos), size)
+                    table[pos + size] = entry[:3] + (self.version,) + entry[4:]
+            for pos in _keys(table, offset - size, offset + deleted - size):
+                del table[pos]
+        self.gap = offset
+        self.size = size + inserted - deleted
+        self.version += 1
+        while self.edits and self.edits[-1][1] >= offset:
+            self.edits.pop()
+        self.edits.append((self.version, offset))
+
+def _keys(table : dict, start : int, stop : int) -> list:
+    if stop - start < len(table):
+        return [k for k in range(start, stop) if k in table]
+    return [k for k in table if start <= k < stop]
+
+class Document(object):
+    '''An incrementally reparsed text.
+
+    `result` holds the result of `parser` over `text`, like calling the
+    parser would. After `edit`, only the parsers whose examined region
+    overlaps the edit are run again; the results of the others are reused
+    and shifted to their new positions.
+
+    Parsers are assumed not to look behind the position they start at.
+    How far a regex looks past its match is worked out from the characters
+    it can consume; when it can consume any character (`.`, `[^...]`...)
+    it is assumed to look at most `margin` characters past its match, and
+    at the rest of the text when it fails. Parsers overriding `run` are
+    treated the same way. Values returned by `map` functions are reused as
+    they are, so they should not depend on absolute positions in the text.
+
+    A repetition (Many, SepBy) whose items overlap an edit runs again over
+    all of its items, each of them a memo lookup rather than a parse, and
+    rebuilds its list. An edit to a flat list of many records thus costs
+    time linear in their number, a fraction of a full parse; nesting the
+    records in groups keeps edits to the groups they touch.'''
+
+    def __init__(self, parser : Parser, text : str, margin : int = 1) -> None:
+        self.parser = parser
+        self.text = text
+        self.memo = _ExtentMemo(margin)
+        self.result = None
+        self._generation = None
+        self.reparse()
+
+    def edit(self, offset : int, deleted : int, inserted : str = ''):
+        '''Replaces `deleted` characters at `offset` with `inserted` and
+        returns the new result.'''
+        if not 0 <= offset <= offset + deleted <= len(self.text):
+            raise ValueError('Edit out of the bounds of the text.')
+        self.text = self.text[:offset] + inserted + self.text[offset + deleted:]
+        self.memo.shift(offset, deleted, len(inserted))
+        return self.reparse()
+
+    def reparse(self):
+        if self._generation != combinators._generation:
+            # The grammar changed since the entries were recorded.
+            self.memo.clear()
+            self._generation = combinators._generation
+        _prepare(self.parser)
+        self.memo.install(walk(self.parser), self.text)
+        state.reset()
+        try:
+            res = self.parser._parse(0, self.text)
+        finally:
+            self.memo.uninstall()
+        self.result = parse_error(self.text) if res is None else res
+        return self.result
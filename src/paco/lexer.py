@@ -1,10 +1,125 @@
 import re
-from typing import NamedTuple
+from array import array
+from collections import namedtuple
+from .streaming import chunks_of
 
-class Token(NamedTuple('Token',type=str,data=str,start=int,end=int)):
+class Token(namedtuple('Token', 'type data start end')):
     def __repr__(self) -> str:
         return '(t:{}, d:{}, @[{},{}])'.format(self.type, self.data, self.start, self.end)
 
+class TokenArray(object):
+    '''A compact token stream: kind codes and offsets are kept in parallel
+    arrays and `Token`s are only built, with their data sliced from the
+    source text, when indexed.
+
+    `names` maps kind codes to token types and `codes` maps them back; Tok
+    parsers compare kind codes instead of building tokens.'''
+
+    def __init__(self, text : str, names) -> None:
+        self.text = text
+        self.names = list(names)
+        self.codes = {name : code for code, name in enumerate(self.names)}
+        self.kinds = array('i')
+        self.starts = array('q')
+        self.ends = array('q')
+
+    def append(self, kind : int, start : int, end : int) -> None:
+        self.kinds.append(kind)
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def data(self, i : int) -> str:
+        return self.text[self.starts[i]:self.ends[i]]
+
+    def data_is(self, i : int, data : str) -> bool:
+        start = self.starts[i]
+        return self.ends[i] - start == len(data) and self.text.startswith(data, start)
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __getitem__(self, i : int) -> Token:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        start, end = self.starts[i], self.ends[i]
+        return Token(self.names[self.kinds[i]], self.text[start:end], start, end)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+class LazyTokens(object):
+    '''A token sequence filled from an iterator of Tokens (such as the
+    generator of an `ilexx` tokenizer) as far as it is indexed, so a parse
+    over it only lexes up to the furthest token its Tok parsers looked at.
+
+    `release(pos)`, called by a Commit parser, drops the buffered tokens
+    before `pos`. Reading one of them afterwards raises a ValueError. A
+    lexing error is raised by reads past the last token lexed. Both are
+    kept in `error`, since parsers that backtrack swallow exceptions, and
+    raised by the parse once it returns.'''
+
+    def __init__(self, tokens) -> None:
+        self._source = iter(tokens)
+        self._buffer = []
+        self._offset = 0
+        self._done = False
+        self.error = None
+
+    @property
+    def lexed(self) -> int:
+        '''Number of tokens lexed so far.'''
+        return self._offset + len(self._buffer)
+
+    def _fill(self, i : int) -> None:
+        buffer = self._buffer
+        while not self._done and self._offset + len(buffer) <= i:
+            try:
+                buffer.append(next(self._source))
+            except StopIteration:
+                self._done = True
+            except Exception as e:
+                self.error = e
+                self._done = True
+
+    def __getitem__(self, i : int) -> Token:
+        j = i - self._offset
+        if 0 <= j < len(self._buffer):
+            return self._buffer[j]
+        if i < 0:
+            if i < -len(self):
+                raise IndexError('Token index out of range')
+            return self[len(self) + i]
+        if j < 0:
+            err = ValueError('Token {} was released by a commit'.format(i))
+            self.error = self.error or err
+            raise err
+        self._fill(i)
+        if j >= len(self._buffer):
+            if self.error is not None:
+                raise self.error
+            raise IndexError('Token index out of range')
+        return self._buffer[j]
+
+    def release(self, pos : int) -> None:
+        drop = min(pos, self.lexed) - self._offset
+        if drop > 0:
+            del self._buffer[:drop]
+            self._offset += drop
+
+    def __len__(self) -> int:
+        # Lexes everything that is left.
+        self._fill(float('inf'))
+        return self.lexed
+
+    def __iter__(self):
+        i = self._offset
+        while True:
+            try:
+                yield self[i]
+            except IndexError:
+                return
+            i += 1
+
 def lexx(regexes):
     regs = [(n, re.compile(r)) for n,r in regexes]
     def tokenizer(text, i=0):
@@ -36,3 +151,97 @@ def lexx2(regexes):
                 raise Exception('Unrecognized character \'{}\''.format(text[tokens[-1].end]))
         return tokens
     return tokenizer
+
+
+def ilexx(regexes, lookahead : int = 1, max_token : int = 1 << 16):
+    '''Like lexx2, but the tokenizer is a generator over a str, a file
+    object or an iterable of chunks.
+
+    Tokens are yielded as they are scanned and only the unscanned tail of
+    the input is buffered. A match is only trusted once `lookahead` more
+    characters are buffered after it (or the input ended), so a token that
+    crosses a chunk boundary is scanned again once the next chunk arrives.
+    Any position that no rule matches raises an exception: at once when no
+    rule can start with its character, otherwise once `max_token`
+    characters are buffered from it.'''
+    from .atomic import Regex
+    namedRules = [('(?P<{}>{})'.format(name, rule) if name else '({})'.format(rule)) for name, rule in regexes]
+    r = re.compile('|'.join(namedRules))
+    (first, nullable) = Regex('|'.join(namedRules))._first(set())
+    first = None if nullable else first
+
+    def tokenizer(source, chunk_size : int = 1 << 16):
+        buf, pos, offset, eof = '', 0, 0, False
+        chunks = chunks_of(source, chunk_size)
+        while True:
+            while pos < len(buf):
+                match = r.match(buf, pos)
+                if match is None or match.end() == pos:
+                    if not eof and (first is None or buf[pos] in first) and len(buf) - pos < max_token:
+                        break
+                    raise Exception('Unrecognized character \'{}\' @{}'.format(buf[pos], pos + offset))
+                if match.end() + lookahead > len(buf) and not eof:
+                    break
+                if match.lastgroup:
+                    yield Token(match.lastgroup, match.group(), match.start() + offset, match.end() + offset)
+                pos = match.end()
+            if eof:
+                return
+            # Read at least as much as is still buffered so that a token
+            # spanning many chunks is not copied once per chunk.
+            pending, wanted = [], max(len(buf) - pos, 1)
+            for chunk in chunks:
+                pending.append(chunk)
+                wanted -= len(chunk)
+                if wanted <= 0:
+                    break
+            else:
+                eof = True
+            buf, offset, pos = buf[pos:] + ''.join(pending), offset + pos, 0
+    return tokenizer
+
+def clexx(regexes):
+    '''Like lexx2, but the tokenizer returns a TokenArray and raises on any
+    position that no rule matches.'''
+    namedRules = [('(?P<{}>{})'.format(name, rule) if name else '({})'.format(rule)) for name, rule in regexes]
+    r = re.compile('|'.join(namedRules))
+    names = [name for name, _ in regexes if name]
+    codes = {r.groupindex[name] : code for code, name in enumerate(names)}
+
+    def tokenizer(text):
+        tokens = TokenArray(text, names)
+        append, match, pos = tokens.append, r.match, 0
+        while pos < len(text):
+            m = match(text, pos)
+            if m is None or m.end() == pos:
+                raise Exception('Unrecognized character \'{}\' @{}'.format(text[pos], pos))
+            code = codes.get(m.lastindex)
+            if code is not None:
+                append(code, pos, m.end())
+            pos = m.end()
+        return tokens
+    return tokenizer
+
+def dlexx(regexes, keywords = None):
+    '''Like lexx2, but the rules are compiled into one automaton (see
+    paco.dfa) that scans each token once and keeps the longest match, the
+    earliest rule winning ties. Keywords need no careful ordering:
+    `keywords` maps a rule name to a {text : type} dict looked up after
+    that rule matched, e.g. {'id' : {'if' : 'kw', 'else' : 'kw'}}.
+    Raises on any position that no rule matches.'''
+    from .dfa import DFA
+    dfa = DFA([rule for _, rule in regexes])
+    names = [name for name, _ in regexes]
+    words = [(keywords or {}).get(name) for name in names]
+
+    def tokenizer(text):
+        tokens = []
+        for (rule, start, end) in dfa.scan(text):
+            name = names[rule]
+            if name:
+                data = text[start:end]
+                if words[rule] is not None:
+                    name = words[rule].get(data, name)
+                tokens.append(Token(name, data, start, end))
+        return tokens
+    return tokenizer
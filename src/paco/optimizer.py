@@ -0,0 +1,204 @@
+from .combinators import (Parser, Sequence, KeepLeft, KeepRight, Choice, Many,
+                          SepBy, Lazy, Map, ErrMap)
+from .atomic import (Char, Literal, Literals, Regex, Tok)
+
+_ATOMS = {
+    Char : lambda p : p.char,
+    Literal : lambda p : p.literal,
+    Literals : lambda p : (p.literals, p.longest),
+    Regex : lambda p : (p.rule.pattern, p.rule.flags),
+    Tok : lambda p : (p.tag, p.data),
+}
+
+class _Tag(object):
+    # Marks the values of the rest of a factored alternative with its index.
+
+    def __init__(self, index : int) -> None:
+        self.index = index
+
+    def __call__(self, values):
+        return (self.index, values)
+
+class _Rebuild(object):
+    # Builds the value a factored alternative would have returned from the
+    # values of the common prefix and of the rest of the alternative.
+
+    def __init__(self, kinds : list) -> None:
+        self.kinds = kinds
+
+    def __call__(self, values):
+        (index, rest) = values[-1]
+        values = values[:-1] + rest
+        kind = self.kinds[index]
+        if kind is Sequence:
+            return values
+        return values[0] if kind is KeepLeft else values[-1]
+
+class _Optimizer(object):
+
+    def __init__(self) -> None:
+        self.done = {}
+        self.nodes = {}
+
+    def node(self, parser : Parser) -> Parser:
+        if id(parser) in self.done:
+            return self.done[id(parser)]
+        kind = type(parser)
+        if kind in _ATOMS:
+            key = (kind, getattr(parser, 'name', None), _ATOMS[kind](parser))
+            new = self.nodes.setdefault(key, parser)
+        elif kind is Lazy:
+            new = Lazy()
+            new.name = parser.name
+            # Registered before its target so that cycles end here.
+            self.done[id(parser)] = new
+            if parser.p:
+                new.p = self.node(parser.p)
+        elif kind in _BUILDERS:
+            new = self.cons(_BUILDERS[kind](self, parser), parser.name)
+        else:
+            # Parsers of other classes and their children are kept as they are.
+            new = parser
+        self.done[id(parser)] = new
+        return new
+
+    def cons(self, new : Parser, name : str) -> Parser:
+        '''Returns an existing node equal to `new`, or `new` itself.'''
+        new.name = name
+        kind = type(new)
+        if kind is Map:
+            extra = tuple(map(id, new.funcs))
+        elif kind is ErrMap:
+            extra = id(new.func)
+        else:
+            extra = None
+        key = (kind, name, tuple(map(id, new._children())), extra)
+        return self.nodes.setdefault(key, new)
+
+    def children(self, parsers : list, splice) -> list:
+        out = []
+        for i, p in enumerate(parsers):
+            p = self.node(p)
+            if p.name == 'parser()' and splice(i, p):
+                out.extend(p.parsers)
+            else:
+                out.append(p)
+        return out
+
+    def sequence(self, parser : Sequence) -> Parser:
+        return Sequence(*map(self.node, parser.parsers))
+
+    def keepright(self, parser : KeepRight) -> Parser:
+        last = len(parser.parsers) - 1
+        # Values other than the last one are dropped, so nested sequences
+        # are run in place; the last one may only be another KeepRight.
+        return KeepRight(*self.children(parser.parsers, lambda i, p :
+            type(p) is KeepRight or (i < last and type(p) in (Sequence, KeepLeft))))
+
+    def keepleft(self, parser : KeepLeft) -> Parser:
+        return KeepLeft(*self.children(parser.parsers, lambda i, p :
+            type(p) is KeepLeft or (i > 0 and type(p) in (Sequence, KeepRight))))
+
+    def choice(self, parser : Choice) -> Parser:
+        alternatives = []
+        for p in self.children(parser.parsers, lambda i, p : type(p) is Choice):
+            # An alternative that failed at a position fails there again.
+            if p not in alternatives:
+                alternatives.append(p)
+        return Choice(*self.factor(alternatives))
+
+    def factor(self, alternatives : list) -> list:
+        '''Merges runs of adjacent alternatives that start with the same
+        atoms, so that the common prefix is parsed once.'''
+        out, i = [], 0
+        while i < len(alternatives):
+            head = _steps(alternatives[i])
+            j = i + 1
+            while (head is not None and j < len(alternatives)
+                   and _common(head[1], _steps(alternatives[j])) > 0):
+                j += 1
+            if j - i < 2:
+                out.append(alternatives[i])
+                i += 1
+                continue
+            group = [_steps(p) for p in alternatives[i:j]]
+            size = min(_common(head[1], steps) for steps in group)
+            rest = [self.cons(Map(self.cons(Sequence(*steps[size:]), 'parser()'), _Tag(n)), 'parser()')
+                    for n, (_, steps) in enumerate(group)]
+            body = Sequence(*(head[1][:size] + [self.cons(Choice(*rest), 'parser()')]))
+            # The merged alternative stays in this Choice, which still
+            # reports the failure when none matches.
+            merged = Map(self.cons(body, 'parser()'), _Rebuild([kind for kind, _ in group]))
+            out.append(self.cons(merged, 'parser()'))
+            i = j
+        return out
+
+    def many(self, parser : Many) -> Parser:
+        return Many(self.node(parser.parser))
+
+    def sepby(self, parser : SepBy) -> Parser:
+        return SepBy(self.node(parser.tar), self.node(parser.sep))
+
+    def map(self, parser : Map) -> Parser:
+        inner = self.node(parser.parser)
+        funcs = list(parser.funcs)
+        if type(inner) is Map and inner.name == 'parser()':
+            # Chained maps are applied by a single node.
+            (inner, funcs) = (inner.parser, inner.funcs + funcs)
+        new = Map(inner, funcs[0])
+        new.funcs = funcs
+        return new
+
+    def errmap(self, parser : ErrMap) -> Parser:
+        return ErrMap(self.node(parser.parser), parser.func)
+
+_BUILDERS = {
+    Sequence : _Optimizer.sequence,
+    KeepRight : _Optimizer.keepright,
+    KeepLeft : _Optimizer.keepleft,
+    Choice : _Optimizer.choice,
+    Many : _Optimizer.many,
+    SepBy : _Optimizer.sepby,
+    Map : _Optimizer.map,
+    ErrMap : _Optimizer.errmap,
+}
+
+def _steps(parser : Parser):
+    '''(kind, parsers) of an alternative that may be factored, None if it
+    may not.'''
+    kind = type(parser)
+    if kind in _ATOMS:
+        # The value of a single atom is the first (and only) one.
+        return (KeepLeft, [parser])
+    if kind in (Sequence, KeepLeft, KeepRight) and parser.name == 'parser()' and parser.parsers:
+        return (kind, parser.parsers)
+    return None
+
+def _common(head : list, other) -> int:
+    # Only atoms are shared: they do not raise, so parsing them before the
+    # alternatives are tried changes nothing.
+    if other is None:
+        return 0
+    n = 0
+    for a, b in zip(head, other[1]):
+        if a is not b or type(a) not in _ATOMS:
+            break
+        n += 1
+    return n
+
+def optimize(parser : Parser) -> Parser:
+    '''Returns a new grammar equivalent to `parser`, with the same values
+    and errors, that does less work:
+
+    - Choices nested in Choices, and sequences whose values are dropped by
+      a KeepLeft or KeepRight, are flattened into their parent.
+    - Equal atoms, and then equal nodes, are merged into one.
+    - Chained maps are applied by a single Map.
+    - Adjacent alternatives of a Choice that start with the same atoms are
+      merged, so that the common prefix is parsed once, and alternatives
+      repeating an earlier one are dropped.
+
+    Nodes given a name with `rename` are kept as they are written.
+    `parser` itself is not modified; parsers of classes the optimizer does
+    not know are reused as they are.'''
+    return _Optimizer().node(parser)
@@ -0,0 +1,78 @@
+from .state import state
+
+class Memo(object):
+    '''Memo table of a packrat parse.
+
+    While installed, every parser of the grammar remembers its result (or
+    its failure) for each position of the target. A `window` bounds the
+    memory: entries further than `window` positions behind the furthest
+    position reached are evicted. Subclasses can override `evict` to use
+    a different policy.'''
+
+    def __init__(self, window : int = None) -> None:
+        self.window = window
+        self.tables = {}
+        self.tar = None
+        self.furthest = 0
+        self.swept = 0
+        self._installed = []
+
+    def __len__(self) -> int:
+        return sum(len(t) for t in self.tables.values())
+
+    def clear(self) -> None:
+        self.tables.clear()
+        self.furthest = 0
+        self.swept = 0
+
+    def install(self, parsers, tar) -> None:
+        self.clear()
+        self.tar = tar
+        for p in parsers:
+            if '_parse' in p.__dict__:
+                continue
+            p._parse = self.wrap(p, p._parse)
+            self._installed.append(p)
+
+    def uninstall(self) -> None:
+        for p in self._installed:
+            del p._parse
+        self._installed = []
+        self.tar = None
+
+    def wrap(self, parser, parse):
+        table = self.tables.setdefault(parser, {})
+
+        def memo_parse(pos : int, tar):
+            if tar is not self.tar:
+                return parse(pos, tar)
+            try:
+                entry = table[pos]
+            except KeyError:
+                try:
+                    res = parse(pos, tar)
+                except Exception as e:
+                    entry = (None, e)
+                else:
+                    entry = (res, None if res is not None else state.failure)
+                if pos > self.furthest:
+                    self.furthest = pos
+                    if self.window is not None and pos - self.swept > self.window:
+                        self.evict()
+                if self.window is None or pos >= self.furthest - self.window:
+                    table[pos] = entry
+            res, failure = entry
+            if res is None:
+                if isinstance(failure, Exception):
+                    raise failure.with_traceback(None)
+                state.failure = failure
+            return res
+
+        return memo_parse
+
+    def evict(self) -> None:
+        limit = self.furthest - self.window
+        for table in self.tables.values():
+            for pos in [k for k in table if k < limit]:
+                del table[pos]
+        self.swept = self.furthest
@@ -0,0 +1,169 @@
+import itertools
+import multiprocessing
+import os
+import re
+from collections import deque
+from .combinators import (Parser, ParseError, Many, SepBy, walk, parse_error, _prepare)
+from .compiler import _target
+from .state import state
+
+_job = None
+
+def _init(parser : Parser, text) -> None:
+    global _job
+    _job = (parser, text)
+
+def _chunk(span):
+    (parser, text) = _job
+    (start, stop) = span
+    return _records(parser, text[start:stop], 0, _stop(start, stop, text))
+
+def _init_many(grammar) -> None:
+    global _job
+    parser = grammar if isinstance(grammar, Parser) else grammar()
+    _job = (parser, {id(p) : i for i, p in enumerate(walk(parser))})
+
+def _batch(docs : list) -> list:
+    (parser, index) = _job
+    results = []
+    for doc in docs:
+        res = parser(doc)
+        if isinstance(res, ParseError):
+            # The parser is sent back as its index in the grammar.
+            res.parser = index.get(id(res.parser))
+        results.append(res)
+    return results
+
+def _stop(start : int, stop : int, text):
+    # Only the last chunk may not end right after a boundary.
+    return None if stop == len(text) else stop - start
+
+def _records(parser : Parser, tar, pos : int, stop):
+    '''(end, values) of the records of a Many or SepBy from `pos`, None on
+    failure. A chunk ending with a separator (at `stop`) was split right
+    after it, so the next record is in the following chunk.'''
+    if isinstance(parser, Many):
+        return parser._parse(pos, tar)
+    res = parser.tar._parse(pos, tar)
+    if res is None:
+        return None
+    (pos, res) = res
+    data = [res]
+    while True:
+        try:
+            end = parser.sep._parse(pos, tar)
+        except:
+            break
+        if end is None:
+            break
+        if end[0] == stop:
+            return (stop, data)
+        res = parser.tar._parse(end[0], tar)
+        if res is None:
+            return None
+        (pos, res) = res
+        data.append(res)
+    return (pos, data)
+
+def split(text, boundary, chunk_size : int) -> list:
+    '''(start, stop) spans of about `chunk_size` characters, each but the
+    first starting right after a match of `boundary`.'''
+    if isinstance(boundary, Parser):
+        def after(pos):
+            for i in range(pos, len(text)):
+                res = boundary._parse(i, text)
+                if res is not None and res[0] > i:
+                    return res[0]
+            return len(text)
+    else:
+        rule = re.compile(boundary) if isinstance(boundary, (str, bytes)) else boundary
+        def after(pos):
+            m = rule.search(text, pos)
+            return len(text) if m is None else m.end()
+    spans, start = [], 0
+    while start + chunk_size < len(text):
+        stop = after(start + chunk_size)
+        if stop >= len(text):
+            break
+        spans.append((start, stop))
+        start = stop
+    spans.append((start, len(text)))
+    return spans
+
+def parse_parallel(parser : Parser, text, boundary, workers : int = None, chunk_size : int = None):
+    '''Parses `text` with a top-level Many or SepBy in several processes.
+
+    `text` is split into chunks right after matches of `boundary`, a regex
+    or a parser that resynchronizes on the start of a record. For a SepBy
+    the boundary usually is the separator. The records of each chunk are
+    parsed in a process pool and joined in order, so the result is the
+    same as `parser(text)` as long as no record spans a boundary. The
+    values must be picklable.
+
+    When a chunk fails or ends early, the text from its start is parsed
+    again in this process, so errors (and the rest of the result) are
+    exactly those of a sequential parse, with global positions.'''
+    parser = _target(parser)
+    _prepare(parser)
+    if not isinstance(parser, (Many, SepBy)):
+        raise TypeError('Only Many and SepBy parsers can be parsed in parallel.')
+    workers = workers or os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = max(len(text) // (4 * workers), 1 << 16)
+    spans = split(text, boundary, chunk_size)
+    if workers == 1 or len(spans) == 1:
+        results = [_records(parser, text[start:stop], 0, _stop(start, stop, text))
+                   for start, stop in spans]
+    else:
+        with _context().Pool(workers, _init, (parser, text)) as pool:
+            results = list(pool.map(_chunk, spans))
+    values = []
+    for (start, stop), res in zip(spans, results):
+        if res is None or (res[0] != stop - start and stop != len(text)):
+            state.reset()
+            res = _records(parser, text, start, None)
+            if res is None:
+                return parse_error(text)
+            values.extend(res[1])
+            return (res[0], values)
+        values.extend(res[1])
+    return (spans[-1][0] + res[0], values)
+
+def _context():
+    # Forked workers inherit the grammar instead of receiving it pickled.
+    # Its pools take an initializer on Python 3.6, unlike ProcessPoolExecutor.
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('fork' if 'fork' in methods else None)
+
+def parse_many(grammar, docs, workers : int = None, batch_size : int = 256):
+    '''Parses independent documents in a process pool, yielding the result
+    of each one in order, a ParseError for those that fail.
+
+    `grammar` is a parser, or a function without arguments building one,
+    which each worker then calls once. Where workers are not forked the
+    grammar (or the function) is pickled, so its Map and ErrMap functions
+    must be defined at module level. `docs` may be any iterable; documents
+    are sent in batches of `batch_size` and only a few batches per worker
+    are in flight at once. Values must be picklable.'''
+    workers = workers or os.cpu_count() or 1
+    parser = grammar if isinstance(grammar, Parser) else grammar()
+    docs = iter(docs)
+    if workers == 1:
+        for doc in docs:
+            yield parser(doc)
+        return
+    nodes = list(walk(parser))
+    with _context().Pool(workers, _init_many, (grammar,)) as pool:
+        pending = deque()
+        while True:
+            while len(pending) < 2 * workers:
+                batch = list(itertools.islice(docs, batch_size))
+                if not batch:
+                    break
+                pending.append(pool.apply_async(_batch, (batch,)))
+            if not pending:
+                return
+            for res in pending.popleft().get():
+                if isinstance(res, ParseError):
+                    res.parser = None if res.parser is None else nodes[res.parser]
+                yield res
@@ -0,0 +1,170 @@
+import codecs
+from .combinators import (Parser, ParseError, parse_error, _prepare)
+from .atomic import (Char, Literal, Literals, Regex)
+from .incremental import _run_of
+from .vm import Machine, SUSPENDED
+from .state import state
+
+class PushParser(object):
+    '''Parses a stream of `message`s from chunks of input pushed into it as
+    they arrive.
+
+    `feed` returns the messages a chunk completes. A message split across
+    chunks is not parsed again from its start: the parse stops right before
+    the first atom whose result depends on input that was not received yet
+    and resumes there on the next `feed`. `close` marks the end of the input
+    and returns the remaining messages. When the input cannot be parsed, a
+    ParseError with positions relative to the start of the stream is
+    returned last and any further input is ignored. It is returned once
+    the input its message shows (the text a literal was compared with...)
+    has arrived, so it reads as for a parse of the whole input.
+
+    Chars, literals and regexes made of character classes know how much
+    input they need. Other regexes and parsers of other classes are assumed
+    to look at most `lookahead` characters past their match; a regex of the
+    first kind that fails waits for more input unless its first character
+    rules it out. A message is returned as soon as its last atom is
+    complete, so messages should end with a terminator (a newline, a
+    closing bracket...) to be returned without waiting for the next one.
+
+    Chunks are strings or bytes, all of the same type.'''
+
+    def __init__(self, message : Parser, lookahead : int = 1) -> None:
+        _prepare(message)
+        self.machine = Machine(message, flat = True)
+        self.lookahead = lookahead
+        self.buffer = None
+        # Position of the buffer in the stream, and of the next message in
+        # the buffer.
+        self.offset = 0
+        self.pos = 0
+        # State of the machine in the message being parsed.
+        self.frame = None
+        self.code = None
+        self.furthest = (-1, None)
+        # (failure, furthest) of a failed message, until its error is built.
+        self.error = None
+        self.closed = False
+        self.failed = False
+        self._atoms = {}
+
+    def feed(self, chunk) -> list:
+        if self.closed:
+            raise ValueError('Cannot feed a closed parser.')
+        if self.failed:
+            return []
+        if self.buffer is None:
+            self.buffer = chunk[:0]
+        # A failure's positions are kept as they are until it is reported.
+        cut = self.pos if self.error is None else 0
+        if cut:
+            # Drop the messages already returned.
+            self.buffer = self.buffer[cut:]
+            self.offset += cut
+            self.pos = 0
+            if self.frame is not None:
+                (pc, pos, vals, calls, backs) = self.frame
+                backs = [e[:2] + (e[2] - cut,) + e[3:] for e in backs]
+                calls = [(ret, block, at - cut) for (ret, block, at) in calls]
+                self.frame = [pc, pos - cut, vals, calls, backs]
+                (furthest, expected) = self.furthest
+                self.furthest = (furthest - cut if expected else furthest, expected)
+        self.buffer += chunk
+        return self._messages()
+
+    def close(self) -> list:
+        self.closed = True
+        if self.failed or self.buffer is None:
+            return []
+        return self._messages()
+
+    def _messages(self) -> list:
+        buf, out = self.buffer, []
+        more = None if self.closed else self._incomplete
+        while True:
+            if self.error is not None:
+                (failure, furthest) = self.error
+                (culprit, pos) = failure
+                if pos is not None and pos + getattr(culprit, 'length', 1) > len(buf) and not self.closed:
+                    return out
+                state.failure = failure
+                (state.furthest, state.expected) = furthest
+                out.append(parse_error(buf).shifted(self.offset))
+                self.failed = True
+                return out
+            if self.frame is None:
+                if self.pos == len(buf):
+                    return out
+                self.code = self.machine.program
+                self.frame = [0, self.pos, [], [], []]
+                self.furthest = (-1, None)
+            # Other parsers may have run in between, e.g. for other streams.
+            (state.furthest, state.expected) = self.furthest
+            res = self.machine.execute(self.code, self.frame, buf, more)
+            self.furthest = (state.furthest, state.expected)
+            if res is SUSPENDED:
+                return out
+            self.frame = None
+            if res is None:
+                self.error = (state.failure, self.furthest)
+                continue
+            if res[0] == self.pos:
+                pos = self.pos + self.offset
+                out.append(ParseError(pos, pos, 'Message parser made no progress', self.machine.parser))
+                self.failed = True
+                return out
+            out.append(res[1])
+            self.pos = res[0]
+
+    def _incomplete(self, parser : Parser, pos : int, res, tar) -> bool:
+        '''Whether `res`, the result of the atom `parser` at `pos`, could
+        change once more input is appended to `tar`.'''
+        left = len(tar) - pos
+        kind = type(parser)
+        text = tar.__class__ is str
+        if kind is Char or kind is Literal or kind is Literals:
+            literals = self._atoms.get((parser, text))
+            if literals is None:
+                literals = (parser.char,) if kind is Char else \
+                           (parser.literal,) if kind is Literal else parser.literals
+                if not text:
+                    literals = tuple(l.encode() for l in literals)
+                self._atoms[(parser, text)] = literals = (literals, max(map(len, literals)))
+            if left >= literals[1]:
+                return False
+            rest = tar[pos:]
+            return any(len(l) > left and l.startswith(rest) for l in literals[0])
+        if kind is Regex:
+            rule = parser.rule if text else parser._buffer_rule
+            if rule not in self._atoms:
+                self._atoms[rule] = _run_of(rule)
+            run = self._atoms[rule]
+            if run is not None:
+                # It cannot look past the first character it cannot consume.
+                return run.match(tar, pos).end() == len(tar)
+            if res is None:
+                (chars, nullable) = parser._first(set())
+                return not (text and left and chars is not None and not nullable
+                            and tar[pos] not in chars)
+        if res is not None:
+            return res[0] + self.lookahead > len(tar)
+        return left < self.lookahead
+
+async def aiterparse(message : Parser, reader, chunk_size : int = 1 << 16,
+                     lookahead : int = 1, encoding : str = None):
+    '''Parses the messages read from an asyncio.StreamReader, yielding each
+    one as soon as it is complete (see PushParser). Bytes are parsed as
+    they are, or decoded incrementally when `encoding` is given.'''
+    push = PushParser(message, lookahead)
+    decoder = codecs.getincrementaldecoder(encoding)() if encoding else None
+    while True:
+        chunk = await reader.read(chunk_size)
+        if not chunk:
+            break
+        for res in push.feed(decoder.decode(chunk) if decoder else chunk):
+            yield res
+    if decoder:
+        for res in push.feed(decoder.decode(b'', True)):
+            yield res
+    for res in push.close():
+        yield res
@@ -0,0 +1,173 @@
+from copy import deepcopy
+from . import combinators
+from .combinators import (Parser, Sequence, KeepLeft, KeepRight, Map, ErrMap, Fold,
+                          Expression, ParseError, walk, _fuse, _prepare)
+from .atomic import Regex
+from .state import state
+
+class Span(object):
+    '''A match of an atom, as a view into the source it was matched on.
+
+    The substring is only built when it is read: through `text`, `str()`,
+    comparisons or hashing. Comparing a Span to a string compares its text.'''
+
+    __slots__ = ('source', 'start', 'end')
+
+    def __init__(self, source, start : int, end : int) -> None:
+        self.source = source
+        self.start = start
+        self.end = end
+
+    @property
+    def text(self):
+        return self.source[self.start:self.end]
+
+    def __str__(self) -> str:
+        text = self.text
+        return text if isinstance(text, str) else bytes(text).decode('utf-8', 'replace')
+
+    def __repr__(self) -> str:
+        return 'Span({}, {}, {!r})'.format(self.start, self.end, self.text)
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Span):
+            other = other.text
+        return self.text == other
+
+    def __hash__(self) -> int:
+        return hash(self.text)
+
+def materialize(value):
+    '''Replaces the Spans in `value`, and in the lists it holds, with their
+    text.'''
+    if value.__class__ is Span:
+        return value.text
+    if value.__class__ is list:
+        return [materialize(v) for v in value]
+    return value
+
+_MODES = {Sequence : 'all', KeepLeft : 'first', KeepRight : 'last'}
+
+class SpanMode(object):
+    '''While installed, regexes return Spans instead of the strings they
+    matched, and Maps, Folds and Expressions materialize the values they
+    are given before running their functions. Chars and literals already
+    return their own constant strings and are left as they are.'''
+
+    def __init__(self) -> None:
+        self._installed = []
+        self._planned = []
+        self._wrapped = []
+
+    def install(self, parsers) -> None:
+        for p in parsers:
+            kind = type(p)
+            if kind in _MODES:
+                # Fused steps return spans of their groups as well.
+                p._plan = (combinators._generation, _fuse(p.parsers, _MODES[kind], True))
+                self._planned.append(p)
+            if kind is Fold:
+                # The accumulator is the function's own value.
+                self._wrap(p, 'func', _materialized(p.func, 1))
+            elif kind is Expression:
+                for attr in ('prefix', 'infix', 'postfix'):
+                    self._wrap(p, attr, [e[:-1] + (_materialized(e[-1]),) for e in getattr(p, attr)])
+                p._plan = (-1, None, None, None)
+            if '_parse' in p.__dict__:
+                continue
+            if kind is Regex:
+                p._parse = _regex_parse(p, p._parse)
+            elif kind is Map:
+                p._parse = _map_parse(p)
+            else:
+                continue
+            self._installed.append(p)
+
+    def uninstall(self) -> None:
+        for p in self._installed:
+            del p._parse
+        for p in self._planned:
+            p._plan = (-1, None)
+        for (p, attr, value) in self._wrapped:
+            setattr(p, attr, value)
+            if type(p) is Expression:
+                p._plan = (-1, None, None, None)
+        self._installed = []
+        self._planned = []
+        self._wrapped = []
+
+    def _wrap(self, parser : Parser, attr : str, value) -> None:
+        self._wrapped.append((parser, attr, getattr(parser, attr)))
+        setattr(parser, attr, value)
+
+def span_grammar(parser : Parser) -> Parser:
+    '''A copy of the grammar of `parser` with SpanMode installed, kept on
+    `parser` until the grammar changes.'''
+    cached = parser.__dict__.get('_spans')
+    if cached is None or cached[0] != combinators._generation:
+        # Only the parsers are copied: user functions, and the objects
+        # their methods are bound to, are shared with the original.
+        shared = {id(f) : f for p in walk(parser) for f in _functions(p)}
+        copy = deepcopy(parser, shared)
+        _prepare(copy)
+        SpanMode().install(walk(copy))
+        cached = parser._spans = (combinators._generation, copy)
+    return cached[1]
+
+def _functions(parser : Parser) -> list:
+    kind = type(parser)
+    if kind is Map:
+        return parser.funcs
+    if kind is ErrMap:
+        return [parser.func]
+    if kind is Fold:
+        return [parser.func, parser.init]
+    if kind is Expression:
+        return [e[-1] for e in parser.prefix + parser.infix + parser.postfix]
+    return []
+
+def _materialized(func, skip : int = 0):
+
+    def span_func(*values):
+        return func(*values[:skip], *map(materialize, values[skip:]))
+
+    return span_func
+
+def _regex_parse(parser : Regex, parse):
+    match = parser.rule.match
+
+    def span_parse(pos : int, tar):
+        if tar.__class__ is not str:
+            res = parse(pos, tar)
+            return res if res is None else (res[0], Span(tar, pos, res[0]))
+        m = match(tar, pos)
+        if m is None:
+            state.failure = (parser, pos)
+            if pos >= state.furthest:
+                state.expect(parser, pos)
+            return None
+        end = m.end()
+        return (end, Span(tar, pos, end))
+
+    return span_parse
+
+def _map_parse(parser : Map):
+
+    def span_parse(pos : int, tar):
+        res = parser.parser._parse(pos, tar)
+        if res is None:
+            return None
+        (pos, res) = res
+        res = materialize(res)
+        try:
+            for f in parser.funcs:
+                res = f(res)
+        except ParseError as e:
+            state.failure = (e, None)
+            return None
+        return (pos, res)
+
+    return span_parse
@@ -0,0 +1,30 @@
+import threading
+
+class ParseState(threading.local):
+    '''Per-thread bookkeeping of the running parse.
+
+    `failure` holds the last failure as `(parser, pos)`, or `(error, None)`
+    when a ParseError was raised by user code. Messages are only built from
+    it once a failure escapes to `Parser.__call__` or an `ErrMap`.
+
+    `furthest` is the furthest position any atom (or Choice) failed at
+    since the parse started and `expected` the parsers that failed there,
+    in order; they describe the error once the whole parse fails.'''
+
+    failure = None
+    furthest = -1
+    expected = None
+
+    def expect(self, parser, pos : int) -> None:
+        # Only called once `pos >= furthest` was checked inline.
+        if pos > self.furthest:
+            self.furthest = pos
+            self.expected = {parser : None}
+        else:
+            self.expected[parser] = None
+
+    def reset(self) -> None:
+        self.furthest = -1
+        self.expected = None
+
+state = ParseState()
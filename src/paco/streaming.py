@@ -0,0 +1,89 @@
+from .combinators import (Parser, ParseError)
+from .state import state
+
+def chunks_of(source, chunk_size : int = 1 << 16):
+    '''Chunks of a str/bytes, a file object or an iterable of chunks.'''
+    if isinstance(source, (str, bytes)):
+        yield source
+    elif hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        yield from source
+
+def iterparse(record : Parser, source, chunk_size : int = 1 << 16, lookahead : int = 1):
+    '''Applies `record` repeatedly over a file object or an iterable of
+    chunks, yielding each result as soon as it is complete.
+
+    Only the unconsumed tail of the input is kept in memory. A record is
+    accepted once it ends before the end of the buffered input, or at the
+    end of the stream, so records should end with a terminator (a newline,
+    a closing bracket...) for results to match a parse of the whole text.
+    When the input cannot be parsed, a ParseError with positions relative
+    to the start of the stream is yielded last. A failure is final once
+    the input is buffered past what the parsers that failed furthest could
+    look at: their own length for chars and literals, the run of
+    characters they can consume for regexes made of character classes,
+    and `lookahead` characters for other parsers, as with PushParser.'''
+    chunks = chunks_of(source, chunk_size)
+    buf, pos, offset, eof = None, 0, 0, False
+    runs = {}
+    while True:
+        if buf is not None and (pos < len(buf) or eof):
+            if pos == len(buf):
+                return
+            res = record(buf, pos)
+            if isinstance(res, ParseError):
+                if eof or _failed(buf, lookahead, runs):
+                    yield res.shifted(offset)
+                    return
+            elif res[0] < len(buf) or eof:
+                if res[0] == pos:
+                    msg = 'Record parser made no progress'
+                    yield ParseError(pos + offset, pos + offset, msg, record)
+                    return
+                yield res[1]
+                pos = res[0]
+                continue
+        # Read at least as much as is still buffered so that a record
+        # spanning many chunks is retried a logarithmic number of times.
+        pending, wanted = [], max(len(buf) - pos, 1) if buf is not None else 1
+        for chunk in chunks:
+            pending.append(chunk)
+            wanted -= len(chunk)
+            if wanted <= 0:
+                break
+        else:
+            eof = True
+        if buf is None:
+            if not pending:
+                return
+            buf = pending[0][:0]
+        offset += pos
+        buf = buf[pos:] + buf[:0].join(pending)
+        pos = 0
+
+def _failed(tar, lookahead : int, runs : dict) -> bool:
+    # Whether the failure of the last parse over `tar` stays one when more
+    # input is appended, from the parsers that failed furthest.
+    from .atomic import Literal, Literals, Regex
+    from .incremental import _run_of
+    (furthest, expected) = (state.furthest, state.expected)
+    if not expected or furthest + lookahead >= len(tar):
+        return False
+    text = tar.__class__ is str
+    for p in expected:
+        kind = type(p)
+        if kind is Literal or kind is Literals:
+            if furthest + p.length >= len(tar):
+                return False
+        elif kind is Regex:
+            rule = p.rule if text else p._buffer_rule
+            if rule not in runs:
+                runs[rule] = _run_of(rule)
+            if runs[rule] is not None and runs[rule].match(tar, furthest).end() == len(tar):
+                return False
+    return True
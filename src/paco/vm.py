@@ -0,0 +1,448 @@
+from collections.abc import Iterable
+import mmap
+from . import combinators
+from .combinators import (Parser, Sequence, KeepLeft, KeepRight, Choice, Many,
+                          SepBy, Lazy, Map, ErrMap, ParseError, walk, failure_error, parse_error, _fuse,
+                          _prepare, _raise_stream_error)
+from .state import state
+
+# Instructions are tuples whose first item is one of these opcodes.
+LEAF, TRY, OPT, APPEND, GUARD, CHOICE, COMMIT, CALL, RET, PACK, MAP, NEWLIST, \
+    LOOP, WRAP, POP, NOCHOICE, CATCH, UNCATCH, JUMP, END = range(20)
+
+# Kinds of backtrack entries: alternatives of a Choice, items of a Many and
+# separators of a SepBy catch failures and exceptions, an ErrMap only
+# failures.
+_ANY, _FAILURE = 0, 1
+
+SUSPENDED = object()
+'''Returned by `Machine.execute` when it needs more input.'''
+
+def _deep(parser : Parser) -> set:
+    '''Parsers that can reach a cycle of the grammar, i.e. whose recursion
+    depth depends on the input.'''
+    nodes = list(walk(parser))
+    index, low, stack, onstack, cyclic = {}, {}, [], set(), set()
+    for root in nodes:
+        if id(root) in index:
+            continue
+        # Iterative Tarjan: frames are (node, iterator over its children).
+        work = [(root, iter(root._children()))]
+        index[id(root)] = low[id(root)] = len(index)
+        stack.append(root)
+        onstack.add(id(root))
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if id(child) not in index:
+                    index[id(child)] = low[id(child)] = len(index)
+                    stack.append(child)
+                    onstack.add(id(child))
+                    work.append((child, iter(child._children())))
+                    break
+                if id(child) in onstack:
+                    low[id(node)] = min(low[id(node)], index[id(child)])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[id(parent)] = min(low[id(parent)], low[id(node)])
+                if low[id(node)] == index[id(node)]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        onstack.discard(id(member))
+                        component.append(member)
+                        if member is node:
+                            break
+                    if len(component) > 1 or any(c is node for c in node._children()):
+                        cyclic.update(id(c) for c in component)
+    parents = {}
+    for node in nodes:
+        for child in node._children():
+            parents.setdefault(id(child), []).append(node)
+    deep, todo = set(cyclic), list(cyclic)
+    while todo:
+        for parent in parents.get(todo.pop(), ()):
+            if id(parent) not in deep:
+                deep.add(id(parent))
+                todo.append(id(parent))
+    return deep
+
+_MODES = {Sequence : 'all', KeepLeft : 'first', KeepRight : 'last'}
+
+def _direct(parser : Parser) -> Parser:
+    '''The parser to call in place of `parser`: a sequence whose atoms are
+    all fused into one regex is replaced by its fused step.'''
+    mode = _MODES.get(type(parser))
+    if mode is not None:
+        steps = _fuse(parser.parsers, mode)
+        if steps is not None and len(steps) == 1:
+            return steps[0]
+    return parser
+
+class _Label(object):
+    # Patched in once the position of its target is known.
+    pc = None
+
+class _Assembler(object):
+
+    def __init__(self, parser : Parser, flat : bool = False) -> None:
+        if flat:
+            self.deep = {id(node) for node in walk(parser) if type(node) in _KINDS}
+        else:
+            self.deep = _deep(parser)
+        self.code = []
+        self.blocks = {}
+        self.pending = []
+        self.shared = set()
+        seen = set()
+        for node in walk(parser):
+            for child in node._children():
+                if id(child) in seen:
+                    self.shared.add(id(child))
+                seen.add(id(child))
+
+    def label(self):
+        return _Label()
+
+    def place(self, label) -> None:
+        label.pc = len(self.code)
+
+    def program(self, parser : Parser) -> list:
+        self.emit(parser, True)
+        self.code.append((END,))
+        while self.pending:
+            (node, label) = self.pending.pop()
+            self.place(label)
+            self.emit(node, True, inline = True)
+            self.code.append((RET,))
+        return [tuple(a.pc if isinstance(a, _Label) else a for a in ins) for ins in self.code]
+
+    def emit(self, node : Parser, keep : bool, inline : bool = False) -> None:
+        code, kind = self.code, type(node)
+        if id(node) not in self.deep or kind not in _KINDS or (kind is Lazy and not node.p):
+            code.append((LEAF, _direct(node), keep))
+            return
+        if not inline and (kind is Lazy or id(node) in self.shared):
+            if id(node) not in self.blocks:
+                self.blocks[id(node)] = self.label()
+                self.pending.append((node, self.blocks[id(node)]))
+            code.append((CALL, self.blocks[id(node)]))
+            if not keep:
+                code.append((POP,))
+            return
+        if kind is Lazy:
+            self.emit(node.p, keep)
+        elif kind is Sequence:
+            for p in node.parsers:
+                self.emit(p, keep)
+            if keep:
+                code.append((PACK, len(node.parsers)))
+        elif kind is KeepLeft or kind is KeepRight:
+            last = len(node.parsers) - 1
+            for i, p in enumerate(node.parsers):
+                self.emit(p, keep and i == (0 if kind is KeepLeft else last))
+        elif kind is Map:
+            self.emit(node.parser, True)
+            code.append((MAP, node.funcs))
+            if not keep:
+                code.append((POP,))
+        elif kind is ErrMap:
+            end = self.label()
+            code.append((CATCH, _FAILURE, end, node))
+            self.emit(node.parser, True)
+            code.append((UNCATCH,))
+            self.place(end)
+            if not keep:
+                code.append((POP,))
+        elif kind is Choice:
+            end = self.label()
+            for p in node.parsers:
+                (chars, nullable) = p._first(set())
+                chars = None if nullable else chars
+                if id(p) not in self.deep:
+                    # A Map is applied here rather than through its _parse.
+                    if type(p) is Map:
+                        code.append((TRY, _direct(p.parser), keep, chars, end, p.funcs))
+                    else:
+                        code.append((TRY, _direct(p), keep, chars, end, ()))
+                    continue
+                nxt = self.label()
+                if chars is not None:
+                    code.append((GUARD, chars, nxt))
+                code.append((CHOICE, _ANY, nxt))
+                self.emit(p, keep)
+                code.append((COMMIT, end))
+                self.place(nxt)
+            code.append((NOCHOICE, node))
+            self.place(end)
+        elif kind is Many:
+            end = self.label()
+            if keep:
+                code.append((NEWLIST,))
+            code.append((CHOICE, _ANY, end))
+            body = len(code)
+            self.emit(node.parser, keep)
+            if keep:
+                code.append((APPEND, None))
+            code.append((LOOP, body))
+            self.place(end)
+        elif kind is SepBy:
+            end, again = self.label(), self.label()
+            self.emit(node.tar, keep)
+            if keep:
+                code.append((WRAP,))
+            self.place(again)
+            if id(node.sep) not in self.deep:
+                code.append((OPT, _direct(node.sep), end))
+            else:
+                code.append((CHOICE, _ANY, end))
+                self.emit(node.sep, False)
+                nxt = self.label()
+                code.append((COMMIT, nxt))
+                self.place(nxt)
+            self.emit(node.tar, keep)
+            code.append((APPEND, again) if keep else (JUMP, again))
+            self.place(end)
+
+_KINDS = (Sequence, KeepLeft, KeepRight, Choice, Many, SepBy, Lazy, Map, ErrMap)
+
+class Machine(object):
+    '''Runs a grammar on an explicit stack instead of Python's.
+
+    The parts of the grammar that can recurse (the parsers that reach a
+    cycle through a Lazy) are assembled into instructions of a small stack
+    machine; the parts that cannot are called directly as they always are.
+    Nesting in the input is then only limited by memory, except through
+    parsers of classes the machine does not know, which are called
+    directly as well. Calling it behaves like calling the original parser,
+    including its errors.
+
+    With `flat=True` every combinator is assembled, so that only atoms are
+    called directly.'''
+
+    def __init__(self, parser : Parser, flat : bool = False) -> None:
+        self.parser = parser
+        self.flat = flat
+        self._program = (-1, None)
+
+    @property
+    def program(self) -> list:
+        if self._program[0] != combinators._generation:
+            program = _Assembler(self.parser, self.flat).program(self.parser)
+            self._program = (combinators._generation, program)
+        return self._program[1]
+
+    def __call__(self, stream, idx = 0):
+        if not isinstance(stream, (Iterable, mmap.mmap)):
+            raise TypeError('Stream object should be iterable.')
+        _prepare(self.parser)
+        state.reset()
+        res = self.run(idx, stream)
+        _raise_stream_error(stream)
+        if res is None:
+            return parse_error(stream)
+        return res
+
+    def run(self, pos : int, tar):
+        '''(pos, value) of a match at `pos`, None on failure.'''
+        return self.execute(self.program, [0, pos, [], [], []], tar)
+
+    def execute(self, code : list, frame : list, tar, more = None):
+        '''Runs `code` from the state in `frame`: [pc, pos, values, calls,
+        backtrack entries]. Calls are (return pc, block, position) entries.
+
+        `more(parser, pos, res, tar)` tells whether the result of an atom
+        could change once more input is appended to `tar`. If so, or if the
+        machine has to look at the end of `tar`, its state is saved in
+        `frame` and SUSPENDED is returned; calling `execute` again with the
+        extended target resumes at that atom.'''
+        (pc, pos, vals, calls, backs) = frame
+        text = tar.__class__ is str
+        size = len(tar)
+        exc = None
+        while True:
+            ins = code[pc]
+            op = ins[0]
+            if op == TRY:
+                chars = ins[3]
+                if text and chars is not None and (pos >= size or tar[pos] not in chars):
+                    if pos >= size and more is not None:
+                        frame[:] = (pc, pos, vals, calls, backs)
+                        return SUSPENDED
+                    pc += 1
+                    continue
+                try:
+                    res = ins[1]._parse(pos, tar)
+                    if more is not None and more(ins[1], pos, res, tar):
+                        frame[:] = (pc, pos, vals, calls, backs)
+                        return SUSPENDED
+                    if res is not None and ins[5]:
+                        v = res[1]
+                        for f in ins[5]:
+                            v = f(v)
+                        res = (res[0], v)
+                except ParseError as e:
+                    state.failure = (e, None)
+                    res = None
+                except Exception:
+                    res = None
+                    if more is not None and more(ins[1], pos, None, tar):
+                        frame[:] = (pc, pos, vals, calls, backs)
+                        return SUSPENDED
+                if res is None:
+                    pc += 1
+                else:
+                    pos = res[0]
+                    if ins[2]:
+                        vals.append(res[1])
+                    pc = ins[4]
+                continue
+            elif op == LEAF:
+                try:
+                    res = ins[1]._parse(pos, tar)
+                except Exception as e:
+                    res, exc = None, e
+                if more is not None and more(ins[1], pos, res, tar):
+                    frame[:] = (pc, pos, vals, calls, backs)
+                    return SUSPENDED
+                if res is not None:
+                    pos = res[0]
+                    if ins[2]:
+                        vals.append(res[1])
+                    pc += 1
+                    continue
+            elif op == OPT:
+                try:
+                    res = ins[1]._parse(pos, tar)
+                except Exception:
+                    res = None
+                if more is not None and more(ins[1], pos, res, tar):
+                    frame[:] = (pc, pos, vals, calls, backs)
+                    return SUSPENDED
+                if res is None:
+                    pc = ins[2]
+                else:
+                    pos = res[0]
+                    pc += 1
+                continue
+            elif op == APPEND:
+                v = vals.pop()
+                vals[-1].append(v)
+                pc = pc + 1 if ins[1] is None else ins[1]
+                continue
+            elif op == CALL:
+                # Calls are entered at nondecreasing positions, so a block
+                # still running at this position is among the last ones: it
+                # would call itself again forever (left recursion).
+                i = len(calls) - 1
+                while i >= 0 and calls[i][2] == pos and calls[i][1] != ins[1]:
+                    i -= 1
+                if i < 0 or calls[i][2] != pos:
+                    calls.append((pc + 1, ins[1], pos))
+                    pc = ins[1]
+                    continue
+                exc = RecursionError('Left recursion at position {}'.format(pos))
+            elif op == RET:
+                pc = calls.pop()[0]
+                continue
+            elif op == CHOICE:
+                backs.append((ins[1], ins[2], pos, len(vals), len(calls)))
+                pc += 1
+                continue
+            elif op == COMMIT:
+                backs.pop()
+                pc = ins[1]
+                continue
+            elif op == GUARD:
+                if text and (pos >= size or tar[pos] not in ins[1]):
+                    if pos >= size and more is not None:
+                        frame[:] = (pc, pos, vals, calls, backs)
+                        return SUSPENDED
+                    pc = ins[2]
+                else:
+                    pc += 1
+                continue
+            elif op == PACK:
+                n = ins[1]
+                if n:
+                    v = vals[-n:]
+                    del vals[-n:]
+                    vals.append(v)
+                else:
+                    vals.append([])
+                pc += 1
+                continue
+            elif op == MAP:
+                try:
+                    v = vals[-1]
+                    for f in ins[1]:
+                        v = f(v)
+                    vals[-1] = v
+                    pc += 1
+                    continue
+                except ParseError as e:
+                    state.failure = (e, None)
+                except Exception as e:
+                    exc = e
+            elif op == LOOP:
+                (kind, label, _, depth, ncalls) = backs[-1]
+                backs[-1] = (kind, label, pos, depth, ncalls)
+                pc = ins[1]
+                continue
+            elif op == NEWLIST:
+                vals.append([])
+                pc += 1
+                continue
+            elif op == WRAP:
+                vals[-1] = [vals[-1]]
+                pc += 1
+                continue
+            elif op == POP:
+                vals.pop()
+                pc += 1
+                continue
+            elif op == JUMP:
+                pc = ins[1]
+                continue
+            elif op == NOCHOICE:
+                state.failure = (ins[1], pos)
+                if pos >= state.furthest:
+                    state.expect(ins[1], pos)
+            elif op == CATCH:
+                backs.append((ins[1], ins[2], pos, len(vals), len(calls), ins[3]))
+                pc += 1
+                continue
+            elif op == UNCATCH:
+                backs.pop()
+                pc += 1
+                continue
+            elif op == END:
+                return (pos, vals.pop())
+            # Failure: resume at the innermost backtrack entry that catches it.
+            while True:
+                if not backs:
+                    if exc is not None:
+                        raise exc
+                    return None
+                entry = backs.pop()
+                if exc is not None and entry[0] == _FAILURE:
+                    continue
+                (kind, pc, pos, depth, ncalls) = entry[:5]
+                del vals[depth:]
+                del calls[ncalls:]
+                exc = None
+                if kind == _ANY:
+                    break
+                try:
+                    res = entry[5].func(failure_error(tar))
+                except ParseError as e:
+                    state.failure = (e, None)
+                    continue
+                except Exception as e:
+                    exc = e
+                    continue
+                (pos, res) = res
+                vals.append(res)
+                break
@@ -0,0 +1,33 @@
+import mmap
+import tempfile
+import unittest
+from paco.combinators import Lazy
+from paco.atomic import (Char, Literal, Literals, Regex)
+from paco.miscellaneous import (OWS, INTEGER, STRING)
+
+class TestBufferTargets(unittest.TestCase):
+
+    def setUp(self):
+        self.array = Lazy()
+        element = (INTEGER.map(int) | STRING | Literals('true', 'false') | self.array) << OWS
+        self.array.p = Char('[') >> OWS >> element.sepby(Char(',') << OWS) << Char(']')
+        self.text = "[1, 'a', [true, 22], false]"
+
+    def test_bytes(self):
+        expected = (len(self.text), [1, b"'a'", [b'true', 22], b'false'])
+        self.assertEqual(self.array(self.text.encode()), expected)
+        self.assertEqual(self.array(memoryview(self.text.encode())), expected)
+        self.assertEqual(self.array(bytearray(self.text.encode())), expected)
+
+    def test_mmap(self):
+        with tempfile.TemporaryFile() as f:
+            f.write(self.text.encode())
+            f.flush()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                self.assertEqual(self.array(m)[1][2], [b'true', 22])
+
+    def test_error(self):
+        for rule in (Char('x'), Literal('xy'), Regex(r'[a-z]+'), self.array):
+            result, err = rule(b'[1, 2'), rule('[1, 2')
+            self.assertEqual((result.start, result.end, result.msg), (err.start, err.end, err.msg))
+        self.assertEqual(Char('é')('é'.encode()), (2, 'é'.encode()))
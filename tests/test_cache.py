@@ -0,0 +1,90 @@
+import os
+import re
+import tempfile
+import unittest
+from paco import combinators
+from paco.combinators import (Lazy, Many, walk)
+from paco.atomic import (Char, Literals, Regex)
+from paco.cache import (cached, load)
+
+builds = []
+
+def grammar():
+    builds.append(1)
+    value = Lazy()
+    num = Regex(r'[0-9]+').map(int)
+    value.p = (Char('[') >> value.sepby(Char(',')) << Char(']')) \
+              | num | Literals('true', 'false')
+    return value
+
+def unpicklable():
+    return Regex(r'[0-9]+').map(lambda v : int(v))
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'grammar.paco')
+        del builds[:]
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_reload(self):
+        text = '[1,[2,true],[3]]'
+        first = cached(grammar, self.path)
+        second = cached(grammar, self.path)
+        self.assertEqual(len(builds), 1)
+        self.assertIsNot(first, second)
+        # Plans are saved with the grammar and valid once loaded.
+        plans = [p._plan for p in walk(second) if hasattr(p, '_plan')]
+        self.assertTrue(plans)
+        self.assertTrue(all(plan[0] == combinators._generation for plan in plans))
+        self.assertEqual(second(text), first(text))
+        self.assertEqual(second(text), (16, [1, [2, 'true'], [3]]))
+        self.assertEqual(cached(grammar, self.path, optimize=True)(text), first(text))
+
+    def test_invalidated(self):
+        depend = os.path.join(self.dir.name, 'tokens.txt')
+        for content in ('a', 'a', 'b'):
+            with open(depend, 'w') as f:
+                f.write(content)
+            cached(grammar, self.path, depends=[depend])
+        self.assertEqual(len(builds), 2)
+        self.assertIsNone(load(self.path, 'another key'))
+
+    def test_corrupt(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'\x80\x05garbage')
+        self.assertEqual(cached(grammar, self.path)('[1]'), (3, [1]))
+        self.assertEqual(len(builds), 1)
+
+    def test_unpicklable(self):
+        self.assertEqual(cached(unpicklable, self.path)('12'), (2, 12))
+        self.assertEqual(os.listdir(self.dir.name), [])
+
+    def test_lazy_regex(self):
+        rule = Regex(r'[a-z]+')
+        self.assertNotIn('rule', rule.__dict__)
+        self.assertEqual(rule('abc1'), (3, 'abc'))
+        self.assertIn('rule', rule.__dict__)
+        self.assertEqual(rule('1').msg, "Couldn't match the rule: re.compile('[a-z]+')")
+
+    def test_package(self):
+        import paco
+        self.assertIs(paco.atomic.Char, Char)
+        names = {}
+        exec('from paco import *', names)
+        self.assertEqual(names['combinators'], combinators)
+        self.assertIn('lexer', names)
+
+    def test_invalid_regex(self):
+        # Compiled before the parse, not inside Many which swallows errors.
+        for rule in (Many(Regex('[')), Many(Char('a') + Regex('('))):
+            with self.assertRaises(re.error):
+                rule('x')
+            with self.assertRaises(re.error):
+                rule.recognize('x')
+
+if __name__ == '__main__':
+    unittest.main()
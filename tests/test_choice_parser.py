@@ -42,3 +42,26 @@ class TestChoiceParser(unittest.TestCase):
         self.assertEqual(result.start, err.start)
         self.assertEqual(result.end, err.end)
         self.assertEqual(result.msg, err.msg)
+
+    def test_dispatch(self):
+        rule = Choice(Literal('ab'), Regex(r'[a-c]+'), Char('x'), Regex(r'y*'), Literal('abc'))
+        self.assertEqual(rule('abc'), (2, 'ab'))
+        self.assertEqual(rule('bca'), (3, 'bca'))
+        self.assertEqual(rule('x'), (1, 'x'))
+        self.assertEqual(rule('z'), (0, ''))
+        self.assertEqual(rule(''), (0, ''))
+        rule = Choice(Char('a'), Char('b'))
+        self.assertEqual(rule('c').msg, 'No choice was left')
+        self.assertEqual(rule(['b']), (1, 'b'))
+
+    def test_dispatch_update(self):
+        from paco.combinators import Lazy
+        later = Lazy()
+        rule = Char('a') | later
+        self.assertEqual(rule('b').msg, 'No choice was left')
+        later.p = Char('b')
+        self.assertEqual(rule('b'), (1, 'b'))
+        extended = rule | Char('c')
+        self.assertEqual(extended('c'), (1, 'c'))
+        # The operators build new nodes instead of extending shared ones.
+        self.assertEqual(rule('c').msg, 'No choice was left')
@@ -0,0 +1,54 @@
+import unittest
+from paco.combinators import (Choice, Lazy, Many, ParseError)
+from paco.atomic import (Char, Literal, Regex, Tok)
+from paco.lexer import Token
+
+class TestCompiledParser(unittest.TestCase):
+
+    def setUp(self):
+        ws = Regex(r' *')
+        num = Regex(r'[0-9]+').map(int)
+        self.expr = Lazy()
+        atom = num | (Char('(') << ws >> self.expr << Char(')'))
+        self.expr.p = (atom << ws).sepby(Literal('+') << ws) + Many(Literal('!'))
+        self.compiled = self.expr.compile()
+
+    def test_return(self):
+        for text in ['1', '1 + (2 + 3)!!', '((4))']:
+            self.assertEqual(self.compiled(text), self.expr(text))
+
+    def test_error(self):
+        for text in ['', '(1 + 2', '+', '1 + 2 +']:
+            result, err = self.compiled(text), self.expr(text)
+            self.assertEqual((result.start, result.end, result.msg),
+                             (err.start, err.end, err.msg))
+
+    def test_fallback(self):
+        rule = Tok('num') + Char('x').errmap(lambda e: (e.start, None))
+        compiled = rule.compile()
+        tokens = [Token('num', '1', 0, 1)]
+        self.assertEqual(compiled(tokens), rule(tokens))
+        self.assertEqual(Lazy().compile()('a').msg, 'Lazy Parser was not set!')
+
+    def test_map_error(self):
+        def reject(s):
+            raise ParseError(0, len(s), 'Rejected', None)
+        rule = Regex(r'a+').map(reject)
+        self.assertEqual(rule.compile()('aa').msg, rule('aa').msg)
+        rule = Many(Char('b') + rule) + Regex(r'.*')
+        self.assertEqual(rule.compile()('bab'), rule('bab'))
+
+    def test_source(self):
+        source = self.compiled.source
+        self.assertIn('tar.startswith', source)
+        self.assertEqual(source.count('def '), 6)
+        # Choices dispatch on the next character.
+        self.assertIn('.get(tar[pos]', source)
+
+    def test_dispatch(self):
+        words = ['if', 'in', 'int', 'else', 'elif', 'for', 'while']
+        rule = Many(Choice(*map(Literal, words), Regex(r'[0-9]+').map(int), Regex(r'[a-z]+'))
+                    << Regex(r' *'))
+        compiled = rule.compile()
+        for text in ['int if 12 else elif x', '', 'while 3 ints', '; if']:
+            self.assertEqual(compiled(text), rule(text))
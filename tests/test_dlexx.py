@@ -0,0 +1,50 @@
+import unittest
+from paco.lexer import (lexx, dlexx, Token)
+from paco.dfa import DFA
+
+class TestDlexx(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = [('num', r'[0-9]+(?:\.[0-9]+)?'), ('id', r'[a-zA-Z_][a-zA-Z0-9_]*'),
+                      ('str', r"'[^']*'"), ('op', r'[+\-*/=<>!]=?'), ('punct', r'[()\[\]{},;:]'),
+                      (None, r'[ \t\n]+')]
+
+    def test_same_tokens(self):
+        text = "x1 = (count_2 + 3.14) * 'a b';\nif y >= 10 { z != 'q' }"
+        self.assertEqual(dlexx(self.rules)(text), lexx(self.rules)(text))
+
+    def test_longest(self):
+        tokenizer = dlexx([('eq', '='), ('op', '=='), ('num', '[0-9]+'), ('float', r'[0-9]+\.[0-9]*')])
+        self.assertEqual([t.type for t in tokenizer('===12.5=3')], ['op', 'eq', 'float', 'eq', 'num'])
+        self.assertEqual(tokenizer('12.')[0], Token('float', '12.', 0, 3))
+
+    def test_priority(self):
+        tokenizer = dlexx([('if', 'if'), ('id', '[a-z]+'), (None, ' ')])
+        self.assertEqual(tokenizer('if iffy i'), [Token('if', 'if', 0, 2), Token('id', 'iffy', 3, 7),
+                                                   Token('id', 'i', 8, 9)])
+
+    def test_keywords(self):
+        tokenizer = dlexx(self.rules, keywords = {'id' : {'if' : 'kw', 'else' : 'kw'}})
+        self.assertEqual([(t.type, t.data) for t in tokenizer('if iffy else')],
+                         [('kw', 'if'), ('id', 'iffy'), ('kw', 'else')])
+
+    def test_overlapping_loops(self):
+        tokenizer = dlexx([('word', '[a-z]+'), ('tag', '[a-c]+[0-9]'), (None, ' ')])
+        self.assertEqual([(t.type, t.data) for t in tokenizer('abc1 abcd abcb2x')],
+                         [('tag', 'abc1'), ('word', 'abcd'), ('tag', 'abcb2'), ('word', 'x')])
+
+    def test_constructs(self):
+        dfa = DFA([r'(?i)select', r'a{2,3}b?', r'(?:ab|cd)+|\d\s', r'[^\w]'])
+        self.assertEqual(list(dfa.scan('SeLeCtaaaab')), [(0, 0, 6), (1, 6, 9), (2, 9, 11)])
+        self.assertEqual(list(dfa.scan('abcdab7 %')), [(2, 0, 6), (2, 6, 8), (3, 8, 9)])
+
+    def test_errors(self):
+        with self.assertRaises(Exception):
+            dlexx(self.rules)('x # y')
+        with self.assertRaises(ValueError):
+            DFA([r'^a'])
+        with self.assertRaises(ValueError):
+            DFA([r'(a)\1'])
+
+if __name__ == '__main__':
+    unittest.main()
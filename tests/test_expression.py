@@ -0,0 +1,70 @@
+import math
+import operator
+import random
+import unittest
+from paco.combinators import (Expression, Lazy, ParseError)
+from paco.atomic import (Char, Literal, Regex, Tok)
+from paco.lexer import Token
+
+class TestExpression(unittest.TestCase):
+
+    def setUp(self):
+        self.expr = Lazy()
+        num = Regex(r'[0-9]+').map(int)
+        operand = num | (Char('(') >> self.expr << Char(')'))
+        self.expr.p = Expression(operand,
+            infix = [(Literal('**'), 4, 'right', operator.pow),
+                     (Char('+'), 1, 'left', operator.add), (Char('-'), 1, 'left', operator.sub),
+                     (Char('*'), 2, 'left', operator.mul), (Char('/'), 2, 'left', operator.floordiv)],
+            prefix = [(Char('-'), 3, operator.neg)],
+            postfix = [(Char('!'), 5, math.factorial)])
+
+    def test_precedence(self):
+        cases = {'1+2*3' : 7, '2*3+1' : 7, '10-4-3' : 3, '2**3**2' : 512, '-2**2' : -4,
+                 '-2*3' : -6, '(1+2)*3' : 9, '100/7/2' : 7, '--5' : 5, '7' : 7}
+        for text, value in cases.items():
+            self.assertEqual(self.expr(text), (len(text), value), text)
+
+    def test_postfix(self):
+        self.assertEqual(self.expr('2*3!'), (4, 12))
+        self.assertEqual(self.expr('-3!'), (3, -6))
+        self.assertEqual(self.expr('2**3!!'), (6, 2 ** 720))
+
+    def test_partial(self):
+        self.assertEqual(self.expr('1+2)'), (3, 3))
+        self.assertIsInstance(self.expr('1+'), ParseError)
+        self.assertIsInstance(self.expr('*1'), ParseError)
+        err = self.expr('1+(2*)')
+        self.assertEqual(err.furthest, 5)
+
+    def test_random(self):
+        rand = random.Random(3)
+        def gen(depth):
+            if depth > 3 or rand.random() < 0.3:
+                return rand.choice(['', '-']) + str(rand.randrange(10))
+            if rand.random() < 0.2:
+                return '(' + gen(depth + 1) + ')'
+            return gen(depth + 1) + rand.choice('+-*') + gen(depth + 1)
+        for _ in range(200):
+            text = gen(0)
+            self.assertEqual(self.expr(text), (len(text), eval(text)), text)
+
+    def test_recognize(self):
+        calls = []
+        expr = Expression(Regex(r'[0-9]+'), infix = [(Char('+'), 1, 'left', lambda a, b : calls.append(1))])
+        self.assertEqual(expr.recognize('1+2+3x'), 5)
+        self.assertEqual(calls, [])
+
+    def test_tokens(self):
+        expr = Expression(Tok('num').map(int), infix = [(Tok('op', '+'), 1, 'left', operator.add),
+                                                        (Tok('op', '*'), 2, 'left', operator.mul)])
+        tokens = [Token('num', '2', 0, 1), Token('op', '+', 1, 2), Token('num', '3', 2, 3),
+                  Token('op', '*', 3, 4), Token('num', '4', 4, 5)]
+        self.assertEqual(expr(tokens), (5, 14))
+
+    def test_assoc(self):
+        with self.assertRaises(ValueError):
+            Expression(Char('a'), infix = [(Char('+'), 1, 'none', operator.add)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+from paco.combinators import (Lazy, LineIndex)
+from paco.atomic import (Char, Literals, Regex)
+from paco.streaming import iterparse
+
+class TestFurthestFailure(unittest.TestCase):
+
+    def setUp(self):
+        self.value = Lazy()
+        num = Regex(r'[0-9]+').rename('number')
+        ws = Regex(r'\s*')
+        array = Char('[') >> ws >> self.value.sepby(ws >> Char(',') << ws) << ws << Char(']')
+        self.value.p = array | num | Literals('true', 'false')
+
+    def test_expected(self):
+        text = '[1, [2, true],\n [3, x]]'
+        err = self.value(text)
+        # The error itself is unchanged, the furthest failure comes along.
+        self.assertEqual((err.start, err.msg), (0, 'No choice was left'))
+        self.assertEqual(err.furthest, 20)
+        self.assertEqual(err.expected, ["char('[')", 'number', "lits('true', 'false')"])
+        self.assertEqual(err.explain(text), "Line 2, column 6: expected one of char('['), "
+                                            "number, lits('true', 'false') but got 'x'")
+        for other in (self.value.recognize(text), self.value.machine()(text)):
+            self.assertEqual((other.furthest, other.expected), (err.furthest, err.expected))
+
+    def test_single(self):
+        text = '[1, 2'
+        err = self.value(text)
+        self.assertEqual(err.furthest, 5)
+        self.assertEqual(err.explain(text), "Line 1, column 6: expected one of char(','), "
+                                            "char(']') but got EOF")
+        rule = Char('a') + Char('b')
+        self.assertEqual(rule('ax').explain('ax'), "Line 1, column 2: expected char('b') but got 'x'")
+
+    def test_reset(self):
+        self.value('[1, 2, 3, 4, x]')
+        err = self.value('y')
+        self.assertEqual(err.furthest, 0)
+        self.assertEqual(err.expected, ["char('[')", 'number', "lits('true', 'false')"])
+
+    def test_lines(self):
+        lines = LineIndex('ab\ncd\n\ne')
+        self.assertEqual([lines.locate(p) for p in (0, 1, 3, 6, 7, 8)],
+                         [(1, 1), (1, 2), (2, 1), (3, 1), (4, 1), (4, 2)])
+        self.assertEqual(LineIndex(b'a\nb').locate(2), (2, 1))
+
+    def test_stream(self):
+        record = self.value << Char('\n')
+        *_, err = iterparse(record, ['[1]\n[2', ',x]\n'], 4)
+        self.assertEqual(err.furthest, 7)
+        self.assertEqual(err.explain('[1]\n[2,x]\n'), "Line 2, column 4: expected one of char('['), "
+                                                       "number, lits('true', 'false') but got 'x'")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+from paco.combinators import (Sequence, KeepLeft, KeepRight)
+from paco.atomic import (Char, Literal, Regex)
+from paco.miscellaneous import (OWS, INTEGER)
+
+class TestFusion(unittest.TestCase):
+
+    def test_shapes(self):
+        text = 'let  12 ;'
+        parts = [Literal('let'), OWS, INTEGER, OWS, Char(';')]
+        self.assertEqual(Sequence(*parts)(text), (9, ['let', '  ', '12', ' ', ';']))
+        self.assertEqual(KeepLeft(*parts)(text), (9, 'let'))
+        self.assertEqual(KeepRight(*parts)(text), (9, ';'))
+        self.assertEqual(KeepLeft(INTEGER, OWS)('42 '), (3, '42'))
+        self.assertEqual(KeepRight(OWS, INTEGER.map(int), OWS, INTEGER)(' 1 2'), (4, '2'))
+
+    def test_no_backtracking(self):
+        rule = Regex(r'a*') + Char('a')
+        result = rule('aaa')
+        self.assertEqual((result.start, result.msg), (3, 'Excpected \'a\' but got \'EOF\''))
+        self.assertEqual((Regex(r'a|ab') + Char('b'))('ab'), (2, ['a', 'b']))
+
+    def test_error(self):
+        rule = Literal('let') >> OWS >> INTEGER << Char(';')
+        result, err = rule('let x;'), INTEGER('let x;', 4)
+        self.assertEqual((result.start, result.end, result.msg), (err.start, err.end, err.msg))
+
+    def test_unfusable(self):
+        rule = Regex(r'(a)\1') + Regex(r'(?i)b') + Char('c')
+        self.assertEqual(rule('aaBc'), (4, ['aa', 'B', 'c']))
+        self.assertEqual((Char('a') + Char('b'))(['a', 'b']), (2, ['a', 'b']))
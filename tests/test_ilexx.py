@@ -0,0 +1,50 @@
+import io
+import unittest
+from paco.lexer import (lexx2, ilexx, Token)
+
+class TestIlexx(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = [('kw', r'if|else'), ('id', r'[a-z]+'), ('num', r'[0-9]+'),
+                      ('str', r"'[^']*'"), ('op', r'==|='), (None, r' +')]
+        self.text = "if abc == 12 else x = 'a b' iff"
+
+    def test_return(self):
+        expected = lexx2(self.rules)(self.text)
+        tokenizer = ilexx(self.rules, lookahead = 2)
+        self.assertEqual(list(tokenizer(self.text)), expected)
+        for size in (1, 2, 5):
+            chunks = [self.text[i:i + size] for i in range(0, len(self.text), size)]
+            self.assertEqual(list(tokenizer(chunks)), expected)
+        self.assertEqual(list(tokenizer(io.StringIO(self.text), 3)), expected)
+
+    def test_lazy(self):
+        tokens = ilexx(self.rules)(iter(['if ', 'x', ' #']))
+        self.assertEqual(next(tokens), Token('kw', 'if', 0, 2))
+        self.assertEqual(next(tokens), Token('id', 'x', 3, 4))
+
+    def test_gap(self):
+        tokenizer = ilexx(self.rules)
+        with self.assertRaises(Exception) as ctx:
+            list(tokenizer(['if ', '# x']))
+        self.assertEqual(str(ctx.exception), 'Unrecognized character \'#\' @3')
+        with self.assertRaises(Exception):
+            list(tokenizer("x 'open"))
+
+    def test_early_gap(self):
+        read = []
+        def chunks(first):
+            yield first
+            for i in range(100000):
+                read.append(i)
+                yield 'x y '
+        tokenizer = ilexx(self.rules, max_token = 100)
+        with self.assertRaises(Exception) as ctx:
+            list(tokenizer(chunks('if #')))
+        self.assertEqual(str(ctx.exception), 'Unrecognized character \'#\' @3')
+        self.assertEqual(read, [])
+        # A string could still be closed, until it would be too long.
+        with self.assertRaises(Exception) as ctx:
+            list(tokenizer(chunks("if 'a")))
+        self.assertEqual(str(ctx.exception), 'Unrecognized character \'\'\' @3')
+        self.assertLess(len(read), 100)
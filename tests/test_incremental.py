@@ -0,0 +1,103 @@
+import unittest
+from paco.combinators import (Choice, Lazy, Many, ParseError)
+from paco.atomic import (Char, Literal, Regex)
+from paco.miscellaneous import (STRING, OWS)
+
+class TestIncremental(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = 0
+        def count(x):
+            self.calls += 1
+            return int(x)
+        num = Regex(r'[0-9]+').map(count)
+        comm = Char(',') << OWS
+        self.array = Lazy()
+        element = (num | STRING | self.array) << OWS
+        self.array.p = Char('[') >> OWS >> element.sepby(comm) << Char(']')
+        self.text = '[' + ', '.join("[{}, 'a{}']".format(i, i) for i in range(100)) + ']'
+
+    def assertSame(self, doc):
+        result = self.array(doc.text)
+        if isinstance(result, ParseError):
+            self.assertIsInstance(doc.result, ParseError)
+            self.assertEqual((doc.result.start, doc.result.end, doc.result.msg),
+                             (result.start, result.end, result.msg))
+            # Reused entries report their furthest failures as well.
+            self.assertEqual((doc.result.furthest, doc.result.expected),
+                             (result.furthest, result.expected))
+        else:
+            self.assertEqual(doc.result, result)
+
+    def test_return(self):
+        doc = self.array.incremental(self.text)
+        self.assertEqual(doc.result, self.array(self.text))
+
+    def test_edit(self):
+        doc = self.array.incremental(self.text)
+        offset = self.text.index('50')
+        self.calls = 0
+        doc.edit(offset, 2, '7')
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(doc.result[1][50], [7, "'a50'"])
+        self.assertSame(doc)
+        doc.edit(offset + 1, 0, '1')
+        self.assertEqual(doc.result[1][50], [71, "'a50'"])
+        doc.edit(1, 0, '[1], ')
+        self.assertEqual(doc.result[1][:2], [[1], [0, "'a0'"]])
+        self.assertSame(doc)
+
+    def test_error(self):
+        doc = self.array.incremental(self.text)
+        doc.edit(self.text.index('50'), 0, ',')
+        self.assertIsInstance(doc.result, ParseError)
+        self.assertSame(doc)
+        doc.edit(self.text.index('50'), 1)
+        self.assertEqual(doc.result, self.array(self.text))
+
+    def test_lookahead(self):
+        # A failing string regex looks at the rest of the text, so closing
+        # the string much further on has to be noticed.
+        doc = self.array.incremental("['x, 1, 2, 3, 4, 5, 6, 7, 8]")
+        self.assertIsInstance(doc.result, ParseError)
+        doc.edit(len(doc.text) - 1, 0, "'")
+        self.assertSame(doc)
+        self.assertEqual(doc.result[1], ["'x, 1, 2, 3, 4, 5, 6, 7, 8'"])
+
+    def test_random_edits(self):
+        import random
+        rand = random.Random(7)
+        doc = self.array.incremental(self.text)
+        for _ in range(300):
+            offset = rand.randrange(len(doc.text) + 1)
+            deleted = rand.randrange(min(3, len(doc.text) - offset) + 1)
+            inserted = ''.join(rand.choice("[],1' a") for _ in range(rand.randrange(3)))
+            doc.edit(offset, deleted, inserted)
+            self.assertSame(doc)
+
+    def test_merged_literals(self):
+        # The literals are merged into one trie, which is not memoized.
+        rule = Choice(*map(Literal, [',', 'ba', 'aa', 'ab', 'b']))
+        doc = rule.incremental('b')
+        self.assertEqual(doc.edit(1, 0, 'a'), rule('ba'))
+        import random
+        rand = random.Random(5)
+        rule = Many(rule)
+        doc = rule.incremental('abba,b')
+        for _ in range(300):
+            offset = rand.randrange(len(doc.text) + 1)
+            deleted = rand.randrange(min(2, len(doc.text) - offset) + 1)
+            inserted = ''.join(rand.choice('ab,') for _ in range(rand.randrange(3)))
+            self.assertEqual(doc.edit(offset, deleted, inserted), rule(doc.text))
+
+    def test_grammar_change(self):
+        doc = self.array.incremental('[1, x]')
+        self.assertIsInstance(doc.result, ParseError)
+        self.array.p = self.array.p | Regex(r'[a-z]')
+        doc.edit(0, 0, ' ')
+        self.assertSame(doc)
+
+    def test_bounds(self):
+        doc = self.array.incremental('[1]')
+        with self.assertRaises(ValueError):
+            doc.edit(2, 5)
@@ -0,0 +1,60 @@
+import unittest
+from paco.combinators import (Many, Commit, ParseError)
+from paco.atomic import Tok
+from paco.lexer import (ilexx, LazyTokens, Token)
+
+class TestLazyTokens(unittest.TestCase):
+
+    def setUp(self):
+        self.lexer = ilexx([('num', r'[0-9]+'), ('id', r'[a-z]+'), ('op', r'[=;]'), (None, r' +')])
+        self.stmt = Tok('id') + Tok('op', '=') + (Tok('num') | Tok('id')) + Tok('op', ';')
+        self.text = 'x = 1; y = x; ' * 1000
+
+    def test_on_demand(self):
+        tokens = LazyTokens(self.lexer('x = 1; y = ; ' + self.text))
+        rule = self.stmt + self.stmt
+        err = rule(tokens)
+        self.assertIsInstance(err, ParseError)
+        self.assertEqual((err.start, err.furthest), (6, 6))
+        # Lexed up to the token that failed.
+        self.assertEqual(tokens.lexed, 7)
+        self.assertEqual(tokens[6], Token('op', ';', 11, 12))
+
+    def test_commit(self):
+        tokens = LazyTokens(self.lexer(self.text))
+        (end, stmts) = Many(Commit(self.stmt))(tokens)
+        self.assertEqual((end, len(stmts)), (8000, 2000))
+        self.assertEqual(stmts[1], ['y', '=', 'x', ';'])
+        self.assertEqual(tokens._buffer, [])
+        with self.assertRaises(ValueError):
+            tokens[0]
+        self.assertIsInstance(tokens.error, ValueError)
+        # Without commits everything stays buffered.
+        tokens = LazyTokens(self.lexer(self.text))
+        self.assertEqual(Many(self.stmt)(tokens)[0], 8000)
+        self.assertEqual(len(tokens._buffer), 8000)
+
+    def test_sequence(self):
+        tokens = LazyTokens(self.lexer('a = 1;'))
+        self.assertEqual(tokens[-1], Token('op', ';', 5, 6))
+        self.assertEqual(len(tokens), 4)
+        self.assertEqual([t.data for t in tokens], ['a', '=', '1', ';'])
+        with self.assertRaises(IndexError):
+            tokens[4]
+        self.assertEqual(Tok('num')(tokens, 4).msg, 'Got EOF')
+
+    def test_lexing_error(self):
+        # Raised even though Many stops on it.
+        tokens = LazyTokens(self.lexer('1 2 3 # 4 5'))
+        with self.assertRaises(Exception) as ctx:
+            Many(Tok('num').map(int))(tokens)
+        self.assertIs(ctx.exception, tokens.error)
+        self.assertEqual(str(ctx.exception), "Unrecognized character '#' @6")
+        tokens = LazyTokens(self.lexer('x = 1; y = #'))
+        with self.assertRaises(Exception):
+            Many(self.stmt).recognize(tokens)
+        with self.assertRaises(Exception):
+            list(tokens)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+from paco.combinators import Choice
+from paco.atomic import (Literal, Literals)
+
+class TestLiteralsParser(unittest.TestCase):
+
+    def setUp(self):
+        self.ops = ['=', '==', '=>', '+', '+=', '-']
+        self.rule = Literals(*self.ops)
+
+    def test_name(self):
+        self.assertEqual(Literals('a', 'b').name, 'lits(\'a\', \'b\')')
+
+    def test_return(self):
+        choice = Choice(*map(Literal, self.ops))
+        for text in ['==', '=>', '+=', '-', '+']:
+            self.assertEqual(self.rule(text), choice(text))
+
+    def test_longest(self):
+        rule = Literals(*self.ops, longest=True)
+        self.assertEqual(rule('=='), (2, '=='))
+        self.assertEqual(rule('+-'), (1, '+'))
+
+    def test_error(self):
+        result = self.rule('*')
+        self.assertEqual(result.start, 0)
+        self.assertEqual(result.end, 2)
+        self.assertEqual(result.msg, 'Tried to match one of {} but got EOF'.format(self.ops))
+        self.assertEqual(self.rule('**').msg,
+                         'Tried to match one of {} but got \'**\''.format(self.ops))
+
+    def test_choice_rewrite(self):
+        words = ['in', 'int', 'if', 'i', 'else', 'elif']
+        choice = Choice(*map(Literal, words)) | Literal('x')
+        self.assertEqual(choice('int'), (2, 'in'))
+        self.assertEqual(choice('elif'), (4, 'elif'))
+        self.assertEqual(choice('x'), (1, 'x'))
+        self.assertEqual(choice('y').msg, 'No choice was left')
@@ -0,0 +1,83 @@
+import unittest
+from paco.combinators import (Sequence, KeepLeft, KeepRight, Choice, Lazy, Map, ParseError, walk)
+from paco.atomic import (Char, Literal, Regex)
+from paco.optimizer import optimize
+
+class TestOptimize(unittest.TestCase):
+
+    def assertSame(self, parser, optimized, texts):
+        for text in texts:
+            expected, result = parser(text), optimized(text)
+            if isinstance(expected, ParseError):
+                self.assertIsInstance(result, ParseError)
+                self.assertEqual((result.start, result.end, result.msg),
+                                 (expected.start, expected.end, expected.msg))
+            else:
+                self.assertEqual(result, expected)
+
+    def test_flatten(self):
+        a, b, c = Char('a'), Char('b'), Char('c')
+        rule = KeepRight(c, KeepRight(Sequence(b, a), KeepRight(a, b))) | Choice(a, Choice(b, c))
+        optimized = optimize(rule)
+        self.assertEqual(len(optimized.parsers), 4)
+        self.assertEqual([type(p) for p in optimized.parsers[0].parsers], [Char] * 5)
+        self.assertEqual(len(list(walk(optimized))), 5)
+        self.assertSame(rule, optimized, ['cbaab', 'cba', 'a', 'b', 'c', 'x', ''])
+        # Values of a Sequence keep their nesting.
+        nested = Sequence(a, Sequence(b, c))
+        self.assertEqual(optimize(nested)('abc'), (3, ['a', ['b', 'c']]))
+
+    def test_shared(self):
+        rule = Sequence(Regex('[0-9]+'), Char(','), Regex('[0-9]+'), Char(','))
+        optimized = optimize(rule)
+        self.assertIs(optimized.parsers[0], optimized.parsers[2])
+        self.assertIs(optimized.parsers[1], optimized.parsers[3])
+        self.assertEqual(optimized('1,2,'), (4, ['1', ',', '2', ',']))
+
+    def test_map(self):
+        f, g = int, lambda v : v * 2
+        rule = Map(Map(Regex('[0-9]+'), f), g)
+        optimized = optimize(rule)
+        self.assertIsInstance(optimized.parser, Regex)
+        self.assertEqual(optimized.funcs, [f, g])
+        self.assertEqual(optimized('21'), (2, 42))
+
+    def test_factor(self):
+        num = Regex('[0-9]+')
+        rule = (Char('(') + num + Char(')')) | KeepRight(Char('('), num, Char(','), num) \
+               | (Char('(') + Char('(')) | Char('(') | Literal('x')
+        optimized = optimize(rule)
+        self.assertEqual(len(optimized.parsers), 2)
+        self.assertSame(rule, optimized, ['(1)', '(1,2', '((', '(', '(1', '(1,', 'x', 'y', ''])
+
+    def test_recursive(self):
+        value = Lazy()
+        num = Regex('[0-9]+').map(int)
+        array = (Char('[') + Char(']')).map(lambda _ : []) \
+                | (Char('[') >> value.sepby(Char(',')) << Char(']'))
+        value.p = array | num | (Char('-') >> num).map(lambda v : -v)
+        optimized = optimize(value)
+        self.assertSame(value, optimized, ['[]', '[1,[2,-3],[[]]]', '[1,', '[1,]', '-', '[[4]'])
+
+    def test_unchanged(self):
+        a, b = Char('a'), Char('b')
+        rule = KeepRight(a, KeepRight(a, b)) | Choice(a, b)
+        optimize(rule)
+        self.assertEqual(len(rule.parsers), 2)
+        self.assertEqual(len(rule.parsers[0].parsers[1].parsers), 2)
+
+    def test_operators(self):
+        a, b, c = Char('a'), Char('b'), Char('c')
+        base = a + b
+        longer = base + c
+        self.assertEqual(len(base.parsers), 2)
+        self.assertEqual(longer('abc'), (3, ['a', 'b', 'c']))
+        for op in (KeepLeft(a, b).__lshift__, KeepRight(a, b).__rshift__, Choice(a, b).__or__):
+            self.assertEqual(len(op(c).parsers), 3)
+            self.assertEqual(len(op.__self__.parsers), 2)
+        double = Regex('[0-9]+').map(int)
+        self.assertEqual(double.map(lambda v : v * 2)('4'), (1, 8))
+        self.assertEqual(double('4'), (1, 4))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+from paco.combinators import (Lazy, Memo)
+from paco.atomic import (Char, Regex)
+
+class TestPackrat(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = 0
+        def count(x):
+            self.calls += 1
+            return x
+        self.num = Regex(r'[0-9]+').map(count)
+        self.expr = Lazy()
+        term = (Char('(') >> self.expr << Char(')')) | self.num
+        self.expr.p = (term + Char('+') + self.expr) | (term + Char('-') + self.expr) | term
+
+    def test_return(self):
+        text = '((1+2)-3)+4'
+        self.assertEqual(self.expr(text, packrat=True), self.expr(text))
+
+    def test_error(self):
+        text = '((1+2)-3'
+        result = self.expr(text, packrat=True)
+        err = self.expr(text)
+        self.assertEqual((result.start, result.end, result.msg),
+                         (err.start, err.end, err.msg))
+
+    def test_memoized(self):
+        text = '(' * 8 + '1' + ')' * 8
+        self.expr(text)
+        plain = self.calls
+        self.calls = 0
+        self.expr(text, packrat=True)
+        self.assertEqual(self.calls, 1)
+        self.assertGreater(plain, 1000)
+
+    def test_window(self):
+        text = '+'.join(['1'] * 200)
+        full, windowed = Memo(), Memo(window=16)
+        self.assertEqual(self.expr(text, packrat=windowed), self.expr(text, packrat=full))
+        self.assertLess(len(windowed), len(full) // 4)
+        self.assertNotIn('_parse', self.expr.__dict__)
@@ -0,0 +1,83 @@
+import unittest
+from paco.combinators import (Lazy, Many, ParseError)
+from paco.atomic import (Char, Regex)
+from paco.parallel import (parse_parallel, parse_many, split)
+
+class TestParallel(unittest.TestCase):
+
+    def setUp(self):
+        num = Regex(r'-?[0-9]+').map(int)
+        self.line = Regex(r'[a-z]+') + Char('=') + num << Char('\n')
+        self.lines = Many(self.line)
+        self.csv = num.sepby(Char(','))
+        self.text = ''.join('key{}={}\n'.format('x' * (i % 3), i) for i in range(300))
+
+    def assertSame(self, result, expected):
+        if isinstance(expected, ParseError):
+            self.assertIsInstance(result, ParseError)
+            self.assertEqual((result.start, result.end, result.msg),
+                             (expected.start, expected.end, expected.msg))
+        else:
+            self.assertEqual(result, expected)
+
+    def test_split(self):
+        spans = split(self.text, r'\n', 100)
+        self.assertGreater(len(spans), 10)
+        self.assertEqual(spans[0][0], 0)
+        self.assertEqual(spans[-1][1], len(self.text))
+        for (_, stop), (start, _) in zip(spans, spans[1:]):
+            self.assertEqual(stop, start)
+            self.assertEqual(self.text[stop - 1], '\n')
+
+    def test_many(self):
+        result = parse_parallel(self.lines, self.text, r'\n', workers=3, chunk_size=200)
+        self.assertSame(result, self.lines(self.text))
+
+    def test_sepby(self):
+        text = ','.join(str(i) for i in range(2000))
+        result = parse_parallel(self.csv, text, ',', workers=2, chunk_size=500)
+        self.assertSame(result, self.csv(text))
+        self.assertSame(self.csv.parallel(text + ',', ',', 2, 500), self.csv(text + ','))
+
+    def test_error(self):
+        text = ','.join(str(i) for i in range(2000))
+        text = text[:3000] + ',x' + text[3000:]
+        result = parse_parallel(self.csv, text, ',', workers=2, chunk_size=500)
+        self.assertSame(result, self.csv(text))
+
+    def test_early_stop(self):
+        text = self.text[:2000] + 'key=\n' + self.text[2000:]
+        result = parse_parallel(self.lines, text, r'\n', workers=2, chunk_size=300)
+        self.assertSame(result, self.lines(text))
+        self.assertLess(result[0], len(text))
+
+    def test_parser_boundary(self):
+        result = parse_parallel(self.lines, self.text, Char('\n'), workers=1, chunk_size=150)
+        self.assertSame(result, self.lines(self.text))
+
+    def test_top_level(self):
+        array = Lazy()
+        array.p = self.csv
+        text = '1,2,3'
+        self.assertSame(parse_parallel(array, text, ','), self.csv(text))
+        with self.assertRaises(TypeError):
+            parse_parallel(self.line, self.text, r'\n')
+
+    def test_many_documents(self):
+        docs = ['key={}\n'.format(i) if i % 7 else 'key{}\n'.format(i) for i in range(1000)]
+        results = list(parse_many(self.line, iter(docs), workers=2, batch_size=16))
+        self.assertEqual(len(results), len(docs))
+        for doc, result in zip(docs, results):
+            self.assertSame(result, self.line(doc))
+        err = results[0]
+        self.assertIs(err.parser, self.line(docs[0]).parser)
+        self.assertEqual(list(self.line.parse_many(docs[1:3], workers=1)), [self.line(d) for d in docs[1:3]])
+
+    def test_unpicklable_error(self):
+        # Errors are sent back without the grammar they were raised from.
+        choice = Regex(r'[0-9]+').map(lambda s : int(s)) | Char(';')
+        results = list(choice.parse_many(['1', ';', 'x'], workers=2))
+        self.assertEqual(results[:2], [(1, 1), (1, ';')])
+        self.assertSame(results[2], choice('x'))
+        self.assertIs(results[2].parser, choice)
+        self.assertEqual(results[2].expected, choice('x').expected)
@@ -0,0 +1,39 @@
+import unittest
+from paco.combinators import (Parser, ParseError, Choice)
+from paco.atomic import (Char, Literal)
+
+class Upper(Parser):
+
+    def run(self, pos, tar):
+        if pos < len(tar) and tar[pos].isupper():
+            return (pos + 1, tar[pos])
+        raise ParseError(pos, pos, 'Expected an upper case letter', self)
+
+class Shout(Char):
+
+    def run(self, pos, tar):
+        (pos, res) = super().run(pos, tar)
+        return (pos, res.upper())
+
+class TestParseProtocol(unittest.TestCase):
+
+    def test_run_subclass(self):
+        rule = Upper() | Char('x')
+        self.assertEqual(rule('Ax'), (1, 'A'))
+        self.assertEqual(rule('x'), (1, 'x'))
+        result = (Upper() + Upper())('Ab')
+        self.assertEqual((result.start, result.msg), (1, 'Expected an upper case letter'))
+
+    def test_builtin_subclass(self):
+        self.assertEqual((Shout('a') + Char('b'))('ab'), (2, ['A', 'b']))
+        self.assertEqual(Shout('a')('b').msg, Char('a')('b').msg)
+
+    def test_run_raises(self):
+        with self.assertRaises(ParseError) as ctx:
+            Choice(Literal('a'), Literal('b')).run(0, 'c')
+        self.assertEqual(ctx.exception.msg, 'No choice was left')
+        self.assertEqual(Literal('ab').run(0, 'abc'), (2, 'ab'))
+
+    def test_errmap(self):
+        rule = Literal('a').errmap(lambda e: (e.start, e.msg))
+        self.assertEqual(rule('b'), (0, "Tried to match 'a' but got 'b'"))
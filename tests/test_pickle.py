@@ -0,0 +1,54 @@
+import pickle
+import unittest
+from paco.combinators import (Lazy, Many, walk)
+from paco.atomic import (Char, Literals, Regex, Tok)
+from paco.lexer import Token
+
+class TestPickle(unittest.TestCase):
+
+    def setUp(self):
+        self.value = Lazy()
+        num = Regex(r'[0-9]+').map(int)
+        self.value.p = (Char('[') >> self.value.sepby(Char(',')) << Char(']')) \
+                       | num | Literals('true', 'false')
+
+    def test_grammar(self):
+        text = '[1,[2,true],[3]]'
+        expected = self.value(text)
+        self.value(text.encode())
+        copy = pickle.loads(pickle.dumps(self.value))
+        # Caches are rebuilt rather than pickled.
+        for p in walk(copy):
+            if hasattr(p, '_plan'):
+                self.assertEqual(p._plan[0], -1)
+        self.assertEqual(copy(text)[1], expected[1])
+        self.assertEqual(copy(b'[1]'), (3, [1]))
+
+    def test_tokens(self):
+        rule = Many(Tok('kw', 'if') | Tok('num'))
+        tokens = [Token('kw', 'if', 0, 2), Token('num', '1', 3, 4), Token('kw', 'else', 5, 9)]
+        copy = pickle.loads(pickle.dumps(rule))
+        self.assertEqual(copy(tokens), rule(tokens))
+        self.assertEqual(copy(tokens), (2, ['if', '1']))
+
+    def test_error(self):
+        err = self.value('[1,x]')
+        copy = pickle.loads(pickle.dumps(err))
+        self.assertEqual((copy.start, copy.msg, copy.furthest, copy.expected),
+                         (err.start, err.msg, err.furthest, err.expected))
+
+    def test_installed(self):
+        # A grammar pickled in the middle of a packrat parse leaves the
+        # memo wrappers behind.
+        seen = []
+        def grab(v):
+            seen.append(pickle.dumps(self.value))
+            return v
+        rule = self.value.map(grab)
+        rule('[1]', packrat=True)
+        copy = pickle.loads(seen[0])
+        self.assertFalse(any('_parse' in p.__dict__ for p in walk(copy)))
+        self.assertEqual(copy('[2]'), (3, [2]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+from paco.combinators import (Lazy, Many)
+from paco.atomic import (Char, Regex)
+from paco.profiler import Profiler
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.unit = Regex(r'[0-9]+[a-z]').rename('unit')
+        self.num = Regex(r'[0-9]+').rename('num')
+        self.word = Regex(r'[a-z]+').rename('word')
+        self.item = (self.unit | self.num | self.word).rename('item')
+        self.items = Many(self.item << Regex(r' *'))
+
+    def test_counts(self):
+        with Profiler(self.items) as prof:
+            res = self.items('12 ab 3m 4 cd')
+        self.assertEqual(res, self.items('12 ab 3m 4 cd'))
+        stats = prof.stats
+        item, unit, num, word = (stats[p] for p in (self.item, self.unit, self.num, self.word))
+        self.assertEqual((item.calls, item.successes, item.failures), (6, 5, 1))
+        self.assertEqual((unit.calls, unit.successes, unit.failures), (3, 1, 2))
+        self.assertEqual((num.calls, num.successes), (2, 2))
+        self.assertEqual((word.calls, word.successes), (2, 2))
+        # Only the alternatives that can start with a digit are tried there.
+        self.assertEqual(item.backtracks, 2)
+        self.assertGreaterEqual(item.cumtime, item.selftime)
+        self.assertGreaterEqual(prof.stats[self.items].cumtime, item.cumtime)
+
+    def test_recursion(self):
+        nested = Lazy().rename('nested')
+        nested.p = (Char('(') >> nested << Char(')')) | Char('x')
+        with Profiler(nested) as prof:
+            nested('((((x))))')
+        stat = prof.stats[nested]
+        self.assertEqual(stat.calls, 5)
+        self.assertLessEqual(stat.cumtime, sum(s.selftime for s in prof.stats.values()) * 1.5)
+
+    def test_uninstalled(self):
+        with Profiler(self.items):
+            pass
+        self.assertNotIn('_parse', self.item.__dict__)
+        self.assertNotIn('_parse', self.num.__dict__)
+
+    def test_report(self):
+        with Profiler(self.items) as prof:
+            self.items('12 ab 3m 4 cd')
+        report = prof.report(limit = 3).splitlines()
+        self.assertEqual(len(report), 4)
+        self.assertIn('backtrack', report[0])
+        self.assertEqual(len(prof.hottest(key = 'calls')), 7)
+        self.assertTrue(any(line.endswith('item') for line in prof.report(key = 'calls').splitlines()))
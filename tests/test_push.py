@@ -0,0 +1,100 @@
+import asyncio
+import unittest
+from paco.combinators import (Lazy, ParseError)
+from paco.atomic import (Char, Literal, Literals, Regex)
+from paco.push import (PushParser, aiterparse)
+
+class TestPushParser(unittest.TestCase):
+
+    def setUp(self):
+        num = Regex(r'[0-9]+').map(int)
+        self.array = Lazy()
+        element = self.array | Literal('null') | num
+        self.array.p = Char('[') >> element.sepby(Char(',')) << Char(']')
+        self.message = self.array << Char('\n')
+        self.text = ''.join('[{},[{},null],[0]]\n'.format(i, i * 7) for i in range(200))
+        self.expected = [[i, [i * 7, 'null'], [0]] for i in range(200)]
+
+    def feed(self, push, text, size):
+        out = []
+        for i in range(0, len(text), size):
+            out.extend(push.feed(text[i:i + size]))
+        return out + push.close()
+
+    def test_chunks(self):
+        for size in (1, 2, 7, 100, 100000):
+            self.assertEqual(self.feed(PushParser(self.message), self.text, size), self.expected)
+        data = self.text.encode()
+        self.assertEqual(self.feed(self.message.push(), data, 3),
+                         [[i, [i * 7, b'null'], [0]] for i in range(200)])
+
+    def test_eager(self):
+        push = PushParser(self.message)
+        self.assertEqual(push.feed('[1,[2,nu'), [])
+        self.assertEqual(push.feed('ll]]\n[3'), [[1, [2, 'null']]])
+        # The newline ending the message is still missing.
+        self.assertEqual(push.feed(']'), [])
+        self.assertEqual(push.feed('\n'), [[3]])
+        self.assertEqual(push.close(), [])
+
+    def test_resume(self):
+        # Atoms before the end of the buffer are not run again.
+        calls = []
+        num = Regex(r'[0-9]+').map(lambda v : calls.append(v) or int(v))
+        message = Char('<') >> num.sepby(Char(',')) << Literal('>\n')
+        push = PushParser(message)
+        for c in '<1,22,333>':
+            self.assertEqual(push.feed(c), [])
+        self.assertEqual(push.feed('\n'), [[1, 22, 333]])
+        self.assertEqual(calls, ['1', '22', '333'])
+
+    def test_error(self):
+        push = PushParser(self.message)
+        self.assertEqual(push.feed('[1]\n[2,'), [[1]])
+        *values, err = push.feed('x]\n')
+        self.assertEqual(values, [])
+        self.assertIsInstance(err, ParseError)
+        expected = self.message('[2,x]\n')
+        self.assertEqual((err.start, err.end, err.msg), (expected.start + 4, expected.end + 4, expected.msg))
+        self.assertEqual(push.feed('[3]\n'), [])
+
+    def test_close(self):
+        push = PushParser(self.message)
+        self.assertEqual(push.feed('[1]\n[2'), [[1]])
+        err, = push.close()
+        self.assertIsInstance(err, ParseError)
+        self.assertEqual(err.start, 6)
+        self.assertEqual(PushParser(self.message).close(), [])
+        with self.assertRaises(ValueError):
+            push.feed('3')
+
+    def test_error_message(self):
+        # The message waits for the text the literals are compared with.
+        message = Literals('(a', 'xyz') << Char('\n')
+        push = PushParser(message)
+        self.assertEqual(push.feed('(a\n(b'), ['(a'])
+        err, = push.feed('\n')
+        expected = message('(b\n')
+        self.assertEqual((err.start, err.end, err.msg), (expected.start + 3, expected.end + 3, expected.msg))
+        push = PushParser(message)
+        push.feed('(a\n(b')
+        err, = push.close()
+        self.assertEqual(err.msg, message('(b').msg)
+
+    def test_asyncio(self):
+        async def read(chunks):
+            reader = asyncio.StreamReader()
+            for chunk in chunks:
+                reader.feed_data(chunk)
+            reader.feed_eof()
+            return [v async for v in aiterparse(self.message, reader, 5, encoding='utf-8')]
+        data = '[1,[2,null],[0]]\n[3]\n'.encode()
+        loop = asyncio.new_event_loop()
+        try:
+            values = loop.run_until_complete(read([data[:7], data[7:]]))
+        finally:
+            loop.close()
+        self.assertEqual(values, [[1, [2, 'null'], [0]], [3]])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from paco.combinators import (Lazy, Many, Fold, ParseError)
+from paco.atomic import (Char, Literal, Literals, Regex)
+
+class TestRecognize(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        num = Regex(r'-?[0-9]+').map(lambda v : self.calls.append(v) or int(v))
+        ws = Regex(r'\s*')
+        self.value = Lazy()
+        array = Char('[') >> ws >> self.value.sepby(ws >> Char(',') << ws) << ws << Char(']')
+        self.value.p = array | num | Literals('true', 'false') | (Literal('"') + Regex('[^"]*') + Literal('"'))
+
+    def test_end(self):
+        for text in ['[1, [true, "a b"], [[-2]]]', '7', '[ ]', '[1,]', '[1, [2]', 'x', '']:
+            expected = self.value(text)
+            end = self.value.recognize(text)
+            if isinstance(expected, ParseError):
+                self.assertIsInstance(end, ParseError)
+                self.assertEqual((end.start, end.end, end.msg), (expected.start, expected.end, expected.msg))
+            else:
+                self.assertEqual(end, expected[0])
+        self.assertEqual(Many(self.value << Char(';')).recognize('1;[2];x', 2), 6)
+
+    def test_no_values(self):
+        self.assertEqual(self.value.recognize('[1, [2, 3]]'), 11)
+        self.assertEqual(self.calls, [])
+
+    def test_errmap(self):
+        recovered = Char('a').errmap(lambda e : (e.start + 1, None))
+        self.assertEqual((recovered + Char('c')).recognize('bc'), 2)
+
+    def test_fold(self):
+        num = Regex(r'[0-9]+').map(int)
+        total = num.sepfold(Char('+'), 0, lambda acc, v : acc + v)
+        self.assertEqual(total('1+2+39'), (6, 42))
+        self.assertEqual(total.recognize('1+2+39'), 6)
+        self.assertIsInstance(total('1+'), ParseError)
+        self.assertIsInstance(total(''), ParseError)
+        count = (num << Char(';')).fold(0, lambda acc, v : acc + 1)
+        self.assertEqual(count('1;2;3;x'), (6, 3))
+        self.assertEqual(count(''), (0, 0))
+        self.assertEqual(Fold(Char('a'), '', lambda acc, v : acc + v).recognize('aab'), 2)
+
+if __name__ == '__main__':
+    unittest.main()
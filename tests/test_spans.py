@@ -0,0 +1,101 @@
+import sys
+import threading
+import unittest
+from paco.combinators import (Expression, Sequence, Many, walk)
+from paco.atomic import (Char, Regex)
+from paco.spans import (Span, materialize)
+
+class TestSpans(unittest.TestCase):
+
+    def setUp(self):
+        self.num = Regex(r'[0-9]+')
+        self.rule = Char('[') >> self.num.sepby(Char(',')) << Char(']')
+
+    def test_values(self):
+        (end, values) = self.rule('[1,22,333]', spans=True)
+        self.assertEqual(end, 10)
+        self.assertTrue(all(isinstance(v, Span) for v in values))
+        self.assertEqual([(v.start, v.end) for v in values], [(1, 2), (3, 5), (6, 9)])
+        self.assertEqual(values, ['1', '22', '333'])
+        self.assertEqual(str(values[1]), '22')
+        self.assertEqual(materialize([values, 'x']), [['1', '22', '333'], 'x'])
+        self.assertEqual(self.rule('[1,22,333]'), (10, ['1', '22', '333']))
+
+    def test_fused(self):
+        rule = Sequence(self.num, Char('-'), self.num)
+        (end, values) = rule('12-345', spans=True)
+        self.assertIsInstance(values[0], Span)
+        self.assertEqual(values, ['12', '-', '345'])
+        self.assertEqual((values[2].start, values[2].end), (3, 6))
+        self.assertEqual(rule('12-345'), (6, ['12', '-', '345']))
+
+    def test_map(self):
+        seen = []
+        total = self.rule.map(lambda vs : seen.append(vs) or sum(map(int, vs)))
+        self.assertEqual(total('[1,22,333]', spans=True), (10, 356))
+        self.assertEqual(seen, [['1', '22', '333']])
+        self.assertIs(type(seen[0][0]), str)
+
+    def test_fold(self):
+        rule = Regex('[0-9]').fold('', lambda acc, v : acc + v)
+        self.assertEqual(rule('123', spans=True), (3, '123'))
+        self.assertEqual(rule('123'), (3, '123'))
+
+    def test_expression(self):
+        expr = Expression(self.num, infix = [(Char('+'), 1, 'left', lambda a, b : a + b)],
+                          prefix = [(Char('-'), 2, lambda v : '-' + v)])
+        self.assertEqual(expr('1+-22+3', spans=True), (7, '1-223'))
+        self.assertEqual(expr('1+-22+3'), (7, '1-223'))
+
+    def test_shared_functions(self):
+        # Functions run on the grammar copy keep their own state.
+        class Builder(object):
+            def __init__(self):
+                self.items = []
+            def add(self, item):
+                self.items.append(item)
+                return item
+        builder = Builder()
+        rule = Many(Regex('[a-z]+').map(builder.add) << Char(' '))
+        self.assertEqual(rule('ab cd ', spans=True), (6, ['ab', 'cd']))
+        self.assertEqual(builder.items, ['ab', 'cd'])
+
+    def test_targets(self):
+        rule = Many(Regex('[a-z]+') << Char(' '))
+        (_, values) = rule(b'ab cd ', spans=True)
+        self.assertEqual([v.text for v in values], [b'ab', b'cd'])
+        (_, values) = rule('ab cd ', packrat=True, spans=True)
+        self.assertEqual(values, ['ab', 'cd'])
+
+    def test_error(self):
+        rule = Char('x') + self.num
+        err = rule('xa', spans=True)
+        self.assertEqual((err.furthest, err.expected), (1, ["reg(r'[0-9]+')"]))
+        self.assertEqual(err.expected, rule('xa').expected)
+
+    def test_restored(self):
+        self.rule('[1]', spans=True)
+        self.assertFalse(any('_parse' in p.__dict__ for p in walk(self.rule)))
+        self.assertEqual(self.rule('[1,2]'), (5, ['1', '2']))
+
+    def test_threads(self):
+        done, seen = threading.Event(), []
+        text = '[' + ','.join(map(str, range(200))) + ']'
+        def with_spans():
+            while not done.is_set():
+                self.rule(text, spans=True)
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-5)
+        thread = threading.Thread(target=with_spans)
+        thread.start()
+        try:
+            for _ in range(100):
+                seen.extend(self.rule(text)[1])
+        finally:
+            done.set()
+            thread.join()
+            sys.setswitchinterval(interval)
+        self.assertFalse(any(isinstance(v, Span) for v in seen))
+
+if __name__ == '__main__':
+    unittest.main()
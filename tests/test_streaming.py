@@ -0,0 +1,43 @@
+import io
+import unittest
+from paco.atomic import (Char, Regex)
+from paco.streaming import iterparse
+
+class TestIterparse(unittest.TestCase):
+
+    def setUp(self):
+        num = Regex(r'[0-9]+').map(int)
+        self.record = num.sepby(Char(',')) << Char('\n')
+        self.text = ''.join('{},{},{}\n'.format(i, i * 7, i * 13) for i in range(500))
+
+    def test_chunks(self):
+        expected = [[i, i * 7, i * 13] for i in range(500)]
+        for size in (1, 3, 64, 10000):
+            chunks = (self.text[i:i + size] for i in range(0, len(self.text), size))
+            self.assertEqual(list(iterparse(self.record, chunks)), expected)
+        self.assertEqual(list(self.record.iterparse(io.StringIO(self.text), 5)), expected)
+
+    def test_empty(self):
+        self.assertEqual(list(iterparse(self.record, [])), [])
+        self.assertEqual(list(iterparse(self.record, io.StringIO(''))), [])
+
+    def test_error(self):
+        text = '1,2\n3,x\n'
+        *records, err = iterparse(self.record, io.StringIO(text), 2)
+        self.assertEqual(records, [[1, 2]])
+        self.assertEqual((err.start, err.end), (6, 6))
+        self.assertEqual(err.msg, self.record(text, 4).msg)
+
+    def test_early_error(self):
+        read = []
+        def chunks():
+            for i in range(100000):
+                read.append(i)
+                yield '1,2,3\n'
+        *records, err = iterparse(self.record, ('x\n' if i == 2 else c for i, c in enumerate(chunks())))
+        self.assertEqual(records, [[1, 2, 3]] * 2)
+        self.assertEqual((err.start, err.end), (12, 12))
+        self.assertLess(len(read), 10)
+        # A regex that may go on in the next chunk waits for it.
+        record = Regex(r'[a-z]+') + Char(';')
+        self.assertEqual(list(iterparse(record, ['ab', 'c', 'd;'])), [['abcd', ';']])
@@ -0,0 +1,32 @@
+import unittest
+from paco.combinators import Many
+from paco.atomic import Tok
+from paco.lexer import (lexx2, clexx, Token, TokenArray)
+
+class TestTokenArray(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = [('num', r'[0-9]+'), ('id', r'[a-z]+'), ('op', r'[+*=]'), (None, r' +')]
+        self.text = 'x = 12 + y * 3'
+        self.tokens = clexx(self.rules)(self.text)
+
+    def test_tokens(self):
+        self.assertIsInstance(self.tokens, TokenArray)
+        self.assertEqual(list(self.tokens), lexx2(self.rules)(self.text))
+        self.assertEqual(self.tokens[2], Token('num', '12', 4, 6))
+        self.assertEqual(self.tokens[-1], Token('num', '3', 13, 14))
+        self.assertEqual(len(self.tokens), 7)
+        with self.assertRaises(Exception):
+            clexx(self.rules)('x # y')
+
+    def test_tok(self):
+        rule = Tok('id') + Tok('op', '=') + Many(Tok('num') | Tok('id') | Tok('op', '+') | Tok('op', '*'))
+        expected = (7, ['x', '=', ['12', '+', 'y', '*', '3']])
+        self.assertEqual(rule(self.tokens), expected)
+        self.assertEqual(rule(list(self.tokens)), expected)
+
+    def test_error(self):
+        for rule in (Tok('op'), Tok('id', 'y'), Tok('num') | Tok('op')):
+            result, err = rule(self.tokens), rule(list(self.tokens))
+            self.assertEqual((result.start, result.end, result.msg), (err.start, err.end, err.msg))
+        self.assertEqual(Tok('num')(self.tokens, 7).msg, 'Got EOF')
@@ -0,0 +1,94 @@
+import unittest
+from paco.combinators import (Lazy, Many, ParseError)
+from paco.atomic import (Char, Literal, Regex)
+from paco.vm import Machine
+
+class TestMachine(unittest.TestCase):
+
+    def setUp(self):
+        self.expr = Lazy()
+        num = Regex(r'[0-9]+').map(int)
+        term = (Char('(') >> self.expr << Char(')')) | num
+        self.expr.p = (term + Char('+') + self.expr) | (term + Char('-') + self.expr) | term
+        self.array = Lazy()
+        element = self.array | Regex(r'[a-z]+') | num
+        self.array.p = Char('[') >> element.sepby(Char(',')) << Char(']')
+
+    def assertSame(self, parser, text):
+        expected, result = parser(text), Machine(parser)(text)
+        if isinstance(expected, ParseError):
+            self.assertIsInstance(result, ParseError)
+            self.assertEqual((result.start, result.end, result.msg),
+                             (expected.start, expected.end, expected.msg))
+        else:
+            self.assertEqual(result, expected)
+
+    def test_return(self):
+        for text in ['1', '((1+2)-3)+4', '(1+(2-(3+4)))', '[a,[1,b],[[c]]]', '[1]']:
+            self.assertSame(self.expr if text[0] != '[' else self.array, text)
+
+    def test_error(self):
+        for text in ['((1+2)-3', '1+', '(x)', '']:
+            self.assertSame(self.expr, text)
+        for text in ['[a,[1,b],[[c]]', '[a,]', '[]']:
+            self.assertSame(self.array, text)
+
+    def test_deep(self):
+        depth = 20000
+        text = '[' * depth + 'a' + ']' * depth
+        try:
+            # Choice swallows the RecursionError as a failure.
+            self.assertIsInstance(self.array(text), ParseError)
+        except RecursionError:
+            pass
+        (pos, res) = self.array.machine()(text)
+        self.assertEqual(pos, len(text))
+        for _ in range(depth - 1):
+            (res,) = res
+        self.assertEqual(res, ['a'])
+
+    def test_many(self):
+        items = Lazy()
+        items.p = Many((Char('(') >> items << Char(')')) | Char('x'))
+        for text in ['x(x)((x)x)', '(()', '']:
+            self.assertSame(items, text)
+
+    def test_errmap(self):
+        nested = Lazy()
+        nested.p = (Char('(') >> nested << Char(')')).errmap(lambda e : (e.start, e.msg)) | Char('x')
+        for text in ['((x))', '((y))', '((x)']:
+            self.assertSame(nested, text)
+
+    def test_exceptions(self):
+        def fail(x):
+            raise ValueError(x)
+        nested = Lazy()
+        nested.p = (Char('(') >> nested << Char(')')) | Literal('y').map(fail) | Char('y')
+        self.assertSame(nested, '((y))')
+        rule = nested + Char('x').map(fail)
+        with self.assertRaises(ValueError):
+            rule('(y)x')
+        with self.assertRaises(ValueError):
+            rule.machine()('(y)x')
+
+    def test_update(self):
+        machine = self.array.machine()
+        self.assertIsInstance(machine('[a;b]'), ParseError)
+        self.array.p = Char('[') >> (self.array | Regex(r'[a-z]+')).sepby(Char(';')) << Char(']')
+        self.assertEqual(machine('[a;b]'), self.array('[a;b]'))
+
+    def test_left_recursion(self):
+        # Like the interpreter, a branch calling itself at the same
+        # position fails, and raises when nothing catches it.
+        num = Regex(r'[0-9]+')
+        expr = Lazy()
+        expr.p = (expr + Char('+') + num) | num
+        self.assertEqual(expr.machine()('1+2'), (1, '1'))
+        loop = Lazy()
+        loop.p = loop + Char('x')
+        with self.assertRaises(RecursionError):
+            loop.machine()('x')
+        (a, b) = (Lazy(), Lazy())
+        a.p = (b + Char('a')) | Char('a')
+        b.p = (a + Char('b')) | Char('b')
+        self.assertEqual(a.machine()('ba'), (2, ['b', 'a']))